@@ -96,6 +96,10 @@ class EWFAddressSpace(standard.FileAddressSpace):
         standard.FileAddressSpace.__init__(self, base, config, layered = True)
         self.as_assert(base, "No base address space provided")
         self.as_assert(base.read(0, 6) == "\x45\x56\x46\x09\x0D\x0A", "EWF signature not present")
+        ## Reads must go through libewf rather than a mapping of the raw file
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
         self.fhandle = ewf_open([self.name])
         self.fhandle.seek(0, 2)
         self.fsize = self.fhandle.tell()
@@ -33,7 +33,9 @@
 
 #pylint: disable-msg=C0111
 
+import bisect
 import fractions
+import collections
 import volatility.obj as obj
 import volatility.registry as registry
 import volatility.debug as debug
@@ -43,6 +45,15 @@ import volatility.debug as debug
 ## another module.
 PROFILES = {}
 
+## Counts the writes to any address space. Copies of memory taken
+## before a write may be stale, see AbstractDiscreteAllocMemory.prefetch
+write_generation = 0
+
+def note_write():
+    """Records that memory was written to through some address space"""
+    global write_generation
+    write_generation += 1
+
 class ASAssertionError(AssertionError):
 
     def __init__(self, *args, **kwargs):
@@ -79,7 +90,9 @@ class BaseAddressSpace(object):
                           nargs = 1, action = "callback", callback = check_valid_profile,
                           help = "Name of the profile to load")
 
+        ## The cache identifies images by their contents, see cache.image_identity
         config.add_option("LOCATION", default = None, short_option = 'l',
+                          cache_invalidator = False,
                           help = "A URN location from which to load an address space")
 
     def get_config(self):
@@ -169,15 +182,94 @@ class BaseAddressSpace(object):
         """Compare two addresses and returns True if they're the same, or False if they're not"""
         return cls.address_compare(a, b) == 0
 
+class BlockCache(object):
+    """A least recently used cache of decompressed blocks
+
+    The cache is bounded by the total size of the blocks it holds
+    rather than by their number, since compressed formats use blocks
+    of very different sizes. Address spaces over compressed images
+    (hibernation files, crash dumps etc) can use it to avoid
+    decompressing the same block over and over.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.blocks = collections.OrderedDict()
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        """Returns the cached block, raises KeyError if it's not cached"""
+        try:
+            data = self.blocks.pop(key)
+        except KeyError:
+            self.misses += 1
+            raise
+        ## Move the block to the most recently used end
+        self.blocks[key] = data
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        if key in self.blocks:
+            self.size -= len(self.blocks.pop(key))
+
+        ## Blocks larger than the whole budget are not worth caching
+        if len(data) > self.max_bytes:
+            return
+
+        self.blocks[key] = data
+        self.size += len(data)
+
+        while self.size > self.max_bytes:
+            _key, old = self.blocks.popitem(last = False)
+            self.size -= len(old)
+            self.evictions += 1
+
+    def clear(self):
+        self.blocks.clear()
+        self.size = 0
+
+    def get_stats(self):
+        """Returns the hit, miss and eviction counters of the cache"""
+        return dict(hits = self.hits, misses = self.misses, evictions = self.evictions,
+                    blocks = len(self.blocks), size = self.size)
+
 class AbstractDiscreteAllocMemory(BaseAddressSpace):
     """A class based on memory stored as discrete allocations.
     """
     minimum_size = None
     alignment_gcd = None
 
+    ## Regions read in advance by prefetch(), newest first, and the
+    ## write_generation they were read in
+    snapshots = ()
+    snapshot_generation = 0
+    snapshot_limit = 4
+
     def __init__(self, base, config, *args, **kwargs):
         BaseAddressSpace.__init__(self, base, config, *args, **kwargs)
 
+    def prefetch(self, addr, length):
+        """Reads a region in one go, so that later reads inside it are served
+        from the copy without translating or reading again.
+
+        This is used by obj.BaseObject.snapshot to read a whole struct
+        before its members are accessed. The copies belong to this
+        address space instance, only the last few regions are kept, and
+        all of them are dropped as soon as anything is written through
+        any address space (see note_write). They only go stale when the
+        memory changes underneath volatility, as live memory does, in
+        which case reads see the region as it was when it was
+        prefetched until it is replaced by newer ones.
+        """
+        data = self._read(addr, length, False)
+        if data:
+            self.snapshots = ((addr, data),) + self.snapshots[:self.snapshot_limit - 1]
+            self.snapshot_generation = write_generation
+
+    def drop_snapshots(self):
+        self.snapshots = ()
+
     def translate(self, vaddr):
         raise NotImplementedError("This is an abstract method and should not be referenced directly")
 
@@ -210,6 +302,13 @@ class AbstractDiscreteAllocMemory(BaseAddressSpace):
            If pad is True, any read errors result in "\x00" bytes filling the missing read locations
         """
 
+        if self.snapshots and self.snapshot_generation != write_generation:
+            self.snapshots = ()
+
+        for start, data in self.snapshots:
+            if start <= addr and addr + length <= start + len(data):
+                return data[addr - start:addr - start + length]
+
         if not self.alignment_gcd or not self.minimum_size:
             self.calculate_alloc_stats()
 
@@ -242,7 +341,7 @@ class AbstractDiscreteAllocMemory(BaseAddressSpace):
 
                 if data is None:
                     if not pad:
-                        return obj.NoneObject("Could not read_chunks from addr " + hex(position) + " of size " + hex(datalen))
+                        return obj.NoneObject("Could not read_chunks from addr {0:#x} of size {1:#x}", False, position, datalen)
                     data = "\x00" * datalen
                 buff += data
             position += datalen
@@ -276,6 +375,8 @@ class AbstractRunBasedMemory(AbstractDiscreteAllocMemory):
         AbstractDiscreteAllocMemory.__init__(self, base, config, *args, **kwargs)
         self.runs = []
         self.header = None
+        self._indexed_runs = None
+        self._indexed_count = 0
 
     def get_runs(self):
         """Get the memory block info"""
@@ -285,21 +386,58 @@ class AbstractRunBasedMemory(AbstractDiscreteAllocMemory):
         """Get the header info"""
         return self.header
 
+    def _get_run_index(self):
+        """Returns the runs sorted by address, and a list of their starts
+
+        The index is rebuilt whenever the runs list is replaced or grows,
+        since address spaces fill in self.runs after we're initialized.
+        """
+        if self._indexed_runs is not self.runs or self._indexed_count != len(self.runs):
+            self._sorted_runs = sorted(self.runs)
+            self._run_starts = [input_addr for input_addr, _, _ in self._sorted_runs]
+            self._indexed_runs = self.runs
+            self._indexed_count = len(self.runs)
+        return self._sorted_runs, self._run_starts
+
     def translate(self, addr):
         """Find the offset in the file where a memory address can be found.
 
         @param addr: a memory address
         """
-        for input_addr, output_addr, length in self.runs:
-            if addr >= input_addr and addr < input_addr + length:
-                return output_addr + (addr - input_addr)
-            # Since runs are in order, we can bail out early if we're
-            # looking for something before the start of the current one
-            if addr < input_addr:
-                return None
+        sorted_runs, run_starts = self._get_run_index()
+
+        # Find the last run starting at or before the address
+        i = bisect.bisect_right(run_starts, addr) - 1
+        if i < 0:
+            return None
+
+        input_addr, output_addr, length = sorted_runs[i]
+        if addr < input_addr + length:
+            return output_addr + (addr - input_addr)
 
         return None
 
+    def translate_batch(self, addrs):
+        """Translates a list of memory addresses in one go.
+
+        @param addrs: a list of memory addresses
+        @returns: a list of file offsets (or None) in the same order
+        """
+        sorted_runs, run_starts = self._get_run_index()
+        find = bisect.bisect_right
+
+        results = []
+        for addr in addrs:
+            i = find(run_starts, addr) - 1
+            if i >= 0:
+                input_addr, output_addr, length = sorted_runs[i]
+                if addr < input_addr + length:
+                    results.append(output_addr + (addr - input_addr))
+                    continue
+            results.append(None)
+
+        return results
+
     def get_available_allocs(self):
         """Get a list of accessible physical memory regions"""
         for input_addr, _, length in self.runs:
@@ -365,6 +503,7 @@ class BufferAddressSpace(BaseAddressSpace):
     def write(self, addr, data):
         if not self._config.WRITE:
             return False
+        note_write()
         self.data = self.data[:addr] + data + self.data[addr + len(data):]
         return True
 
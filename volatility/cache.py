@@ -43,7 +43,7 @@ The volatility caching subsystem has the following design goals:
       the currently configured renderer (i.e. its a global setting).
 
  3) Storage of the cache is abstracted and selectable via the
- --cache_engine configuration variable. This allows the separation
+ --cache-engine configuration variable. This allows the separation
  from the concerete storage of the cache and the abstraction of the
  cache in a running process.
 
@@ -112,7 +112,7 @@ Storage classes
 ---------------
 The cache system discussed above can be thought of as an abstract
 construct in the process memory. To make it persistant on disk we have
-the storage class (which can be selected using the --cache_engine
+the storage class (which can be selected using the --cache-engine
 directive). The following cache engines are implemented:
 
 File Storage
@@ -120,14 +120,28 @@ File Storage
 This is the default cache engine. We simply maintain a directory
 structure which corresponds to the URL of the key after applying the
 appropriate filesystem safe escaping operation. Objects are stored in
-stand alone files using the pickle module.
-
-Zip Storage
-===========
-This storage is essentially the same as the File storage above, except
-that the cache directory for each image file is maintained in a Zip
-file stored at the --cache_direcory directive with the same filename
-as the image and a .zip extension.
+stand alone files using the pickle module, below a directory named
+after the image identity with a .cache extension.
+
+Sqlite Storage
+==============
+All the nodes of an image are kept in a single sqlite database stored
+at the --cache-directory directive, named after the image identity
+(see below) with a .cache.db extension. Nodes are written in transactions and
+the database is opened in WAL mode, so several processes may read the
+cache while it is updated. When the database grows past --cache-max-mb
+the least recently used nodes are evicted.
+
+
+Image identity
+--------------
+Although keys are relative to --location, the cache of an image is
+stored under a name derived from its contents (see image_identity()):
+the image size and a hash of --cache-samples blocks spread across it,
+or a hash of the whole image with --cache-full-hash. Copies of an image
+at different paths, or on different hosts sharing a cache directory,
+therefore share their cache, and an image modified in place no longer
+matches the cache built from its old contents.
 
 
 Use cases
@@ -211,12 +225,20 @@ The following common use cases are discussed:
 """
 import types
 import os
+try:
+    import sqlite3
+    has_sqlite = True
+except ImportError:
+    has_sqlite = False
 import urlparse
+import urllib
+import hashlib
 import volatility.conf as conf
 import volatility.obj as obj
 import volatility.debug as debug
 import volatility.exceptions as exceptions
 import cPickle as pickle
+import time
 config = conf.ConfObject()
 
 ## Where to stick the cache
@@ -226,6 +248,115 @@ config.add_option("CACHE-DIRECTORY", default = default_cache_location,
                   cache_invalidator = False,
                   help = "Directory where cache files are stored")
 
+config.add_option("CACHE-SAMPLES", default = 32, type = 'int',
+                  cache_invalidator = False,
+                  help = "Number of blocks hashed to identify an image in the cache")
+
+config.add_option("CACHE-FULL-HASH", default = False, action = 'store_true',
+                  cache_invalidator = False,
+                  help = "Identify images in the cache by a hash of the whole file")
+
+## Size of each block hashed to fingerprint an image
+IDENTITY_BLOCK_SIZE = 0x1000
+
+## Fingerprints already worked out, keyed by (path, size, mtime, method)
+_identities = {}
+
+def image_path():
+    """Returns the local path of the image, or None if it is not a file"""
+    if not config.LOCATION or not config.LOCATION.startswith("file:"):
+        return None
+
+    return urllib.url2pathname(urlparse.urlparse(config.LOCATION).path)
+
+def sampled_fingerprint(fd, size, mtime, samples):
+    """Hashes the size and mtime of the file and samples blocks spread evenly across it"""
+    ## Whole seconds, since filesystems keep mtimes at different precisions
+    digest = hashlib.sha1("{0}:{1}".format(size, int(mtime)))
+    last = max(size - IDENTITY_BLOCK_SIZE, 0)
+    for i in range(samples):
+        fd.seek(last * i // max(samples - 1, 1))
+        digest.update(fd.read(IDENTITY_BLOCK_SIZE))
+
+    return "sampled-" + digest.hexdigest()
+
+def full_fingerprint(fd):
+    """Hashes the entire file"""
+    digest = hashlib.sha1()
+    while True:
+        data = fd.read(0x100000)
+        if not data:
+            break
+        digest.update(data)
+
+    return "sha1-" + digest.hexdigest()
+
+def load_identities():
+    """Returns the full hashes worked out by previous runs"""
+    try:
+        return pickle.load(open(os.path.join(config.CACHE_DIRECTORY, "identities"), "rb"))
+    except (IOError, EOFError, pickle.UnpicklingError):
+        return {}
+
+def save_identities(identities):
+    """Atomically replaces the stored full hashes"""
+    filename = os.path.join(config.CACHE_DIRECTORY, "identities")
+    try:
+        if not os.access(config.CACHE_DIRECTORY, os.W_OK):
+            os.makedirs(config.CACHE_DIRECTORY)
+        temp = "{0}.{1}".format(filename, os.getpid())
+        pickle.dump(identities, open(temp, "wb"), pickle.HIGHEST_PROTOCOL)
+        if os.access(filename, os.F_OK) and os.name == 'nt':
+            os.remove(filename)
+        os.rename(temp, filename)
+    except (IOError, OSError), e:
+        debug.debug("Unable to save image identities: {0}".format(e))
+
+def image_identity():
+    """ Returns a name identifying the contents of the current image.
+
+    Cached results are stored under this name rather than the image's
+    location, so copies of the same image share a cache while a file
+    modified in place gets a new one. By default the name is derived
+    from the size and mtime of the image and a hash of CACHE_SAMPLES
+    blocks. Including the mtime means that a change outside the
+    sampled blocks is still noticed, at the cost of copies which did
+    not preserve the mtime getting a cache of their own. With
+    --cache-full-hash the whole image is hashed instead, which depends
+    on the contents alone. Either way the result is remembered for as
+    long as the file's size and mtime stay the same, full hashes
+    across runs too.
+
+    Locations which are not files are identified by their name.
+    """
+    path = image_path()
+    try:
+        st = os.stat(path)
+    except (TypeError, OSError):
+        return os.path.basename(config.LOCATION or '')
+
+    full = bool(config.CACHE_FULL_HASH)
+    method = ('full',) if full else ('sampled', config.CACHE_SAMPLES)
+    key = (os.path.realpath(path), st.st_size, st.st_mtime, method)
+    try:
+        return _identities[key]
+    except KeyError:
+        pass
+
+    if full:
+        identities = load_identities()
+        identity = identities.get(key)
+        if identity is None:
+            debug.debug("Hashing {0} to identify it in the cache".format(path))
+            identity = full_fingerprint(open(path, "rb"))
+            identities[key] = identity
+            save_identities(identities)
+    else:
+        identity = sampled_fingerprint(open(path, "rb"), st.st_size, st.st_mtime, config.CACHE_SAMPLES)
+
+    _identities[key] = identity
+    return identity
+
 class CacheContainsGenerator(exceptions.VolatilityException):
     """Exception raised when the cache contains a generator"""
     pass
@@ -234,6 +365,10 @@ class InvalidCache(Exception):
     """Exception raised when the cache item is determined to be invalid."""
     pass
 
+class StreamAborted(Exception):
+    """Exception raised when a stream being written lost earlier chunks."""
+    pass
+
 class CacheNode(object):
     """ Base class for Cache nodes """
     def __init__(self, name, stem, storage = None, payload = None, invalidator = None):
@@ -329,6 +464,76 @@ class BlockingNode(CacheNode):
         """Do not set a payload for a blocked cache node"""
         pass
 
+class StreamNode(object):
+    """ A cache node whose payload is a sequence of records.
+
+    Records are appended to the storage in chunks while they are
+    produced, so they never have to be held in memory together and an
+    interrupted run still leaves the records it produced in the
+    cache. The first chunk is the invalidator, which refuses to load a
+    stream written under a different running environment.
+    """
+    def __init__(self, url, storage, invalidator = None):
+        self.url = url
+        self.storage = storage
+        self.invalidator = invalidator
+        self.complete = False
+
+    def state(self):
+        """Returns None, 'partial' or 'complete'"""
+        return self.storage.stream_state(self.url)
+
+    def open(self):
+        """Returns an iterator over the stored records.
+
+        complete is set once the iterator reaches the completion
+        marker. Raises if the stream is missing or invalid.
+        """
+        chunks = self.storage.load_stream(self.url)
+        ## Loading the invalidator raises InvalidCache if it is stale
+        next(chunks)
+        return self._records(chunks)
+
+    def _records(self, chunks):
+        for chunk in chunks:
+            if chunk is None:
+                self.complete = True
+                break
+
+            for record in chunk:
+                yield record
+
+    def start(self):
+        """Starts a new, empty stream, returns False if it can not be stored"""
+        self.storage.reset_stream(self.url)
+        self.complete = False
+        return self.append(self.invalidator)
+
+    def append(self, chunk):
+        """Stores a chunk, returns False (and drops the stream) if that fails"""
+        try:
+            self.storage.append_stream(self.url, chunk)
+            return True
+        except exceptions.CacheRelativeURLException:
+            debug.debug("NOT Streaming url {0} - relative URLs are not yet supported".format(self.url))
+        except (pickle.PickleError, TypeError):
+            debug.debug("NOT Streaming url {0} - contained a non-picklable class".format(self.url))
+        except StreamAborted, e:
+            debug.debug("NOT Streaming url {0} - {1}".format(self.url, e))
+
+        self.reset()
+        return False
+
+    def finish(self):
+        self.storage.finish_stream(self.url)
+        self.complete = True
+
+    def reset(self):
+        try:
+            self.storage.reset_stream(self.url)
+        except exceptions.CacheRelativeURLException:
+            pass
+
 class Invalidator(object):
     """ The Invalidator encapsulates program state to control
     invalidation of the cache.
@@ -348,7 +553,9 @@ class Invalidator(object):
     invalidated.
     """
     def __init__(self):
-        self.callbacks = {}
+        ## The image's location is not part of the signature, its
+        ## contents are
+        self.callbacks = {'image': image_identity}
 
     def add_condition(self, key, callback):
         """Callback will be stored under key and should return a string.
@@ -396,6 +603,15 @@ class CacheTree(object):
         """Pythonic interface to the cache"""
         return self.check(path, cls = self.cls)
 
+    def stream(self, path):
+        """ Returns the StreamNode at the path specified, or None if
+        streams are not cached """
+        if not config.LOCATION or issubclass(self.cls, BlockingNode):
+            return None
+
+        return StreamNode(urlparse.urljoin(config.LOCATION + "/", path),
+                          self.storage, invalidator = self.invalidator)
+
     def invalidate_on(self, key, callback):
         self.invalidator.add_condition(key, callback)
 
@@ -436,27 +652,64 @@ class CacheStorage(object):
     ## Characters allowed in filenames (/'s are allowed since we're dealing with URLs only)
     printables = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz-_./"
 
-    def encode(self, string):
-        result = ''
-        for x in string:
-            if x in self.printables:
-                result += x
-            else:
-                result += "%{0:02X}".format(ord(x))
+    ## Precomputed escape for every byte, so encode is a single join
+    escapes = [chr(x) if chr(x) in printables else "%{0:02X}".format(x) for x in range(256)]
 
-        return result
+    def encode(self, string):
+        escapes = self.escapes
+        return ''.join([escapes[ord(x)] for x in string])
 
-    def filename(self, url):
+    def relative_path(self, url):
+        """Returns the encoded part of url below the current image"""
         if url.startswith(config.LOCATION):
             # Encode just the path part, since everything else is taken from relatively safe/already used data
-            path = self.encode(url[len(config.LOCATION):])
-        else:
-            raise exceptions.CacheRelativeURLException("Storing non relative URLs is not supported now ({0})".format(url))
+            return self.encode(url[len(config.LOCATION):])
+
+        raise exceptions.CacheRelativeURLException("Storing non relative URLs is not supported now ({0})".format(url))
+
+    def load(self, url):
+        """Returns the node stored under url, raising if there is none"""
+        raise NotImplementedError
+
+    def dump(self, url, payload):
+        """Stores payload under url"""
+        raise NotImplementedError
+
+    ## Streams hold a sequence of chunks appended one at a time. A
+    ## finished stream carries a completion marker, an unfinished one
+    ## keeps whatever chunks were written before it was interrupted.
+
+    def stream_state(self, url):
+        """Returns None if there is no stream at url, otherwise
+        'partial' or 'complete'"""
+        raise NotImplementedError
+
+    def load_stream(self, url):
+        """Yields the chunks stored in the stream at url"""
+        raise NotImplementedError
+
+    def append_stream(self, url, chunk):
+        """Appends chunk to the stream at url"""
+        raise NotImplementedError
+
+    def finish_stream(self, url):
+        """Marks the stream at url as complete"""
+        raise NotImplementedError
+
+    def reset_stream(self, url):
+        """Removes the stream at url"""
+        raise NotImplementedError
+
+class FileStorage(CacheStorage):
+    """ Stores every node as a stand alone pickle file below CACHE_DIRECTORY """
+
+    def filename(self, url, extension = '.pickle'):
+        path = self.relative_path(url)
 
         # Join together the bits we need, and abspath it to ensure it's right for the OS it's on
         path = os.path.abspath(os.path.sep.join([config.CACHE_DIRECTORY,
-                                                 os.path.basename(config.LOCATION) + ".cache",
-                                                 path + '.pickle']))
+                                                 image_identity() + ".cache",
+                                                 path + extension]))
 
         return path
 
@@ -493,8 +746,319 @@ class CacheStorage(object):
             # Do nothing if the pickle fails
             debug.debug("NOT Dumping filename {0} - contained a non-picklable class".format(filename))
 
+    ## Streams are written to a .partial file which is renamed to
+    ## .stream once it is complete.
+
+    def stream_state(self, url):
+        if os.access(self.filename(url, '.stream'), os.R_OK):
+            return 'complete'
+        if os.access(self.filename(url, '.partial'), os.R_OK):
+            return 'partial'
+        return None
+
+    def load_stream(self, url):
+        state = self.stream_state(url)
+        if state is None:
+            raise KeyError(url)
+
+        filename = self.filename(url, '.partial' if state == 'partial' else '.stream')
+        debug.debug("Loading stream from {0}".format(filename))
+
+        fd = open(filename, 'rb')
+        try:
+            good = 0
+            while True:
+                try:
+                    chunk = pickle.load(fd)
+                except EOFError:
+                    break
+                except InvalidCache:
+                    raise
+                except Exception:
+                    ## The last write was cut short, drop it so the
+                    ## stream can be appended to again
+                    debug.debug("Truncating {0} to {1} bytes".format(filename, good))
+                    if state == 'partial':
+                        truncated = open(filename, 'r+b')
+                        truncated.truncate(good)
+                        truncated.close()
+                    break
+
+                good = fd.tell()
+                yield chunk
+        finally:
+            fd.close()
+
+    def append_stream(self, url, chunk):
+        filename = self.filename(url, '.partial')
+
+        directory = os.path.dirname(filename)
+        if not os.access(directory, os.R_OK | os.W_OK | os.X_OK):
+            os.makedirs(directory)
+
+        ## Pickle first so a failure does not leave a torn chunk behind
+        data = pickle.dumps(chunk, pickle.HIGHEST_PROTOCOL)
+        fd = open(filename, 'ab')
+        fd.write(data)
+        fd.close()
+
+    def finish_stream(self, url):
+        self.append_stream(url, None)
+
+        filename = self.filename(url, '.stream')
+        if os.access(filename, os.F_OK):
+            os.remove(filename)
+        os.rename(self.filename(url, '.partial'), filename)
+
+    def reset_stream(self, url):
+        for extension in ('.partial', '.stream'):
+            filename = self.filename(url, extension)
+            if os.access(filename, os.F_OK):
+                os.remove(filename)
+
+class SqliteStorage(CacheStorage):
+    """ Stores all the nodes of an image in a single indexed sqlite file.
+
+    Each dump is a transaction, so readers never see a half written
+    node, and the database runs in WAL mode so several volatility
+    processes can read the same cache while another one writes to
+    it. Once the file grows beyond CACHE_MAX_MB the least recently
+    used nodes are evicted.
+    """
+    schema = ("CREATE TABLE IF NOT EXISTS nodes (key TEXT PRIMARY KEY, "
+              "data BLOB, size INTEGER, atime REAL)",
+              "CREATE INDEX IF NOT EXISTS nodes_atime ON nodes (atime)",
+              ## Stream chunks, a NULL chunk marks the end of a stream
+              "CREATE TABLE IF NOT EXISTS streams (key TEXT, seq INTEGER, "
+              "data BLOB, size INTEGER, atime REAL, PRIMARY KEY (key, seq))")
+
+    ## Number of chunks fetched per query when loading a stream
+    page_size = 64
+
+    def __init__(self):
+        self.connections = {}
+        ## The next seq of each stream this process is writing
+        self.writing = {}
+
+    def filename(self):
+        return os.path.abspath(os.path.join(config.CACHE_DIRECTORY,
+                                            image_identity() + ".cache.db"))
+
+    def connection(self):
+        """Returns the (cached) connection to this image's database"""
+        filename = self.filename()
+        try:
+            return self.connections[filename]
+        except KeyError:
+            pass
+
+        directory = os.path.dirname(filename)
+        if not os.access(directory, os.R_OK | os.W_OK | os.X_OK):
+            os.makedirs(directory)
+
+        debug.debug("Opening cache database {0}".format(filename))
+        conn = sqlite3.connect(filename, timeout = 30)
+        conn.text_factory = str
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.DatabaseError:
+            ## Not all filesystems support WAL, fall back to locking
+            pass
+        with conn:
+            for statement in self.schema:
+                conn.execute(statement)
+
+        self.connections[filename] = conn
+        return conn
+
+    def load(self, url):
+        key = self.relative_path(url)
+        conn = self.connection()
+
+        row = conn.execute("SELECT data FROM nodes WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(url)
+
+        debug.debug("Loading {0} from {1}".format(key, self.filename()))
+
+        ## Recording the access is best effort, we do not wait for writers
+        try:
+            with conn:
+                conn.execute("UPDATE nodes SET atime = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.OperationalError:
+            pass
+
+        return pickle.loads(str(row[0]))
+
+    def dump(self, url, payload):
+        try:
+            key = self.relative_path(url)
+        except exceptions.CacheRelativeURLException:
+            debug.debug("NOT Dumping url {0} - relative URLs are not yet supported".format(url))
+            return
+
+        try:
+            data = pickle.dumps(payload, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PickleError, TypeError):
+            debug.debug("NOT Dumping {0} - contained a non-picklable class".format(key))
+            return
+
+        conn = self.connection()
+        debug.debug("Dumping {0} into {1}".format(key, self.filename()))
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO nodes (key, data, size, atime) VALUES (?, ?, ?, ?)",
+                         (key, sqlite3.Binary(data), len(data), time.time()))
+            self.evict(conn)
+
+    def stream_state(self, url):
+        key = self.relative_path(url)
+        row = self.connection().execute("SELECT data IS NULL FROM streams WHERE key = ? "
+                                        "ORDER BY seq DESC LIMIT 1", (key,)).fetchone()
+        if row is None:
+            return None
+        return 'complete' if row[0] else 'partial'
+
+    def load_stream(self, url):
+        key = self.relative_path(url)
+        conn = self.connection()
+        debug.debug("Loading stream {0} from {1}".format(key, self.filename()))
+
+        ## Fetch a page at a time rather than holding a cursor open
+        ## while the caller may be writing to the database
+        seq = -1
+        found = False
+        while True:
+            rows = conn.execute("SELECT seq, data FROM streams WHERE key = ? AND seq > ? "
+                                "ORDER BY seq LIMIT ?", (key, seq, self.page_size)).fetchall()
+            if not rows:
+                break
+
+            found = True
+            for seq, data in rows:
+                if data is None:
+                    yield None
+                else:
+                    yield pickle.loads(str(data))
+
+        if not found:
+            raise KeyError(url)
+
+        try:
+            with conn:
+                conn.execute("UPDATE streams SET atime = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.OperationalError:
+            pass
+
+    def append_stream(self, url, chunk):
+        key = self.relative_path(url)
+        data = pickle.dumps(chunk, pickle.HIGHEST_PROTOCOL)
+        self._append_chunk(key, sqlite3.Binary(data), len(data))
+
+    def finish_stream(self, url):
+        self._append_chunk(self.relative_path(url), None, 0)
+
+    def _append_chunk(self, key, data, size):
+        conn = self.connection()
+        with conn:
+            seq = conn.execute("SELECT COALESCE(MAX(seq) + 1, 0) FROM streams WHERE key = ?",
+                               (key,)).fetchone()[0]
+            ## A stream we are writing must not lose its earlier chunks
+            ## (another process may have evicted it), or the first
+            ## records would be mistaken for its invalidator
+            expected = self.writing.get(key, seq)
+            if seq != expected:
+                conn.execute("DELETE FROM streams WHERE key = ?", (key,))
+                self.writing.pop(key, None)
+                raise StreamAborted("stream was evicted while being written")
+
+            conn.execute("INSERT INTO streams (key, seq, data, size, atime) VALUES (?, ?, ?, ?, ?)",
+                         (key, seq, data, size, time.time()))
+            if data is None:
+                self.writing.pop(key, None)
+            else:
+                self.writing[key] = seq + 1
+            self.evict(conn, keep = key)
+
+    def reset_stream(self, url):
+        key = self.relative_path(url)
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM streams WHERE key = ?", (key,))
+        self.writing.pop(key, None)
+
+    def evict(self, conn, keep = None):
+        """Drops the least recently used nodes and streams until we fit in CACHE_MAX_MB
+
+        Streams this process is still writing, and keep, are never dropped.
+        """
+        limit = (config.CACHE_MAX_MB or 0) * 1024 * 1024
+        if limit <= 0:
+            return
+
+        total = ((conn.execute("SELECT SUM(size) FROM nodes").fetchone()[0] or 0) +
+                 (conn.execute("SELECT SUM(size) FROM streams").fetchone()[0] or 0))
+        if total <= limit:
+            return
+
+        expired = []
+        for table, key, size, _atime in conn.execute(
+            "SELECT 'nodes', key, size, atime FROM nodes UNION ALL "
+            "SELECT 'streams', key, SUM(size), MAX(atime) FROM streams GROUP BY key "
+            "ORDER BY 4").fetchall():
+            if total <= limit:
+                break
+            if table == 'streams' and (key == keep or key in self.writing):
+                continue
+            expired.append((table, key))
+            total -= size
+
+        debug.debug("Evicting {0} entries from the cache".format(len(expired)))
+        for table, key in expired:
+            conn.execute("DELETE FROM {0} WHERE key = ?".format(table), (key,))
+
+## The available storage engines, selected with --cache-engine
+ENGINES = {'file': FileStorage}
+if has_sqlite:
+    ENGINES['sqlite'] = SqliteStorage
+
+config.add_option("CACHE-ENGINE", default = "file", type = "choice",
+                  choices = sorted(ENGINES.keys()), cache_invalidator = False,
+                  help = "Cache storage engine [{0}]".format(" | ".join(sorted(ENGINES.keys()))))
+
+config.add_option("CACHE-MAX-MB", default = 1024, type = 'int',
+                  cache_invalidator = False,
+                  help = "Size limit of a single image cache for engines that evict (0 for unlimited)")
+
+class EngineStorage(object):
+    """ Hands storage requests to the engine chosen with --cache-engine.
+
+    The engine is looked up on every call since the --cache callback
+    can run before the --cache-engine option is parsed.
+    """
+    def __init__(self):
+        self.engines = {}
+
+    def engine(self):
+        name = config.CACHE_ENGINE or 'file'
+        try:
+            return self.engines[name]
+        except KeyError:
+            self.engines[name] = ENGINES[name]()
+            return self.engines[name]
+
+    def __getattr__(self, attr):
+        return getattr(self.engine(), attr)
+
+    def __reduce__(self):
+        ## Cache nodes carry their storage, make sure unpickled nodes
+        ## share ours rather than pickling the engines and their
+        ## open files
+        return 'STORAGE'
+
+STORAGE = EngineStorage()
+
 ## This is the central cache object
-CACHE = CacheTree(CacheStorage(), BlockingNode, invalidator = Invalidator())
+CACHE = CacheTree(STORAGE, BlockingNode, invalidator = Invalidator())
 
 def enable_caching(_option, _opt_str, _value, _parser):
     """Turns off caching by replacing the tree with one that only takes BlockingNodes"""
@@ -503,17 +1067,33 @@ def enable_caching(_option, _opt_str, _value, _parser):
     # but I can't figure another way to ensure that
     # the code gets called and overwrites the outer scope
     global CACHE
-    CACHE = CacheTree(CacheStorage(), invalidator = Invalidator())
+    CACHE = CacheTree(STORAGE, invalidator = Invalidator())
     config.CACHE = True
+    ## Setting the attribute only affects this module's instance, make
+    ## sure the other ConfObjects see it too
+    config.update('CACHE', True)
 
 config.add_option("CACHE", default = False, action = 'callback',
                   cache_invalidator = False,
                   callback = enable_caching,
                   help = "Use caching")
 
+def resume_after_offset(_self, last):
+    """A resume callable for CacheDecorator, for pool scans which take
+    the offset to scan from and yield offsets in increasing order.
+
+    The scan restarts just after the last offset that was cached. This
+    relies on two things: each offset yielded lies within the pool
+    allocation it was found in (from its _POOL_HEADER on), and scanning
+    from an offset only finds allocations whose header starts there or
+    later. So the allocation of the last offset is not found again,
+    and as allocations do not overlap, none after it is skipped.
+    """
+    return dict(offset = last + 1)
+
 class CacheDecorator(object):
     """ This decorator will memoise a function in the cache """
-    def __init__(self, path):
+    def __init__(self, path, resume = None):
         """Wraps a function in a cache decorator.
 
         The results of the function will be cached and memoised. Further
@@ -526,6 +1106,13 @@ class CacheDecorator(object):
            it will be called with the function's args and is expected
            to return a string which will be used as a path.
 
+           resume: Optional callable for generator functions. When a
+           previous run was interrupted it is called with the
+           function's first arg and the last record that was cached,
+           and returns the keyword args which make the function carry
+           on after that record. Without it an interrupted run is
+           started again from scratch.
+
         Returns:
            A decorator.
 
@@ -536,21 +1123,78 @@ class CacheDecorator(object):
            ....
 
         Note the use of the callback to finely tune the cache key depending on external variables.
+
+        A scanner which can restart from an offset may be resumed like
+        this. Records must be picklable, so scanners cache offsets
+        rather than objects:
+
+        @CacheDecorator("scans/connscan2", resume = resume_after_offset)
+        def scan_offsets(self, offset = 0):
+           ....
         """
         self.path = path
+        self.resume = resume
         self.node = None
 
+    ## Number of records written to a stream at a time
+    batch_size = 256
+
     def generate(self, path, g):
         """ Special handling for generators. We pass each iteration
-        back immediately, and keep it in a list. Note that if the
-        generator is aborted, the cache is not dumped.
+        back immediately and append it to a stream in the cache, so
+        if the generator is aborted the records produced so far are
+        kept.
         """
-        payload = []
-        for x in g:
-            payload.append(x)
+        stream = CACHE.stream(path)
+        if stream is None or not stream.start():
+            for x in g:
+                yield x
+            return
+
+        for x in self.record(stream, g):
             yield x
 
-        self.dump(path, payload)
+    def record(self, stream, g):
+        """ Yields the results of g while appending them to stream in
+        batches. The stream is only marked complete if g is exhausted.
+        """
+        batch = []
+        complete = False
+        try:
+            for x in g:
+                batch.append(x)
+                if len(batch) >= self.batch_size:
+                    if stream and not stream.append(batch):
+                        stream = None
+                    batch = []
+                yield x
+
+            complete = True
+        finally:
+            ## Also runs when we are interrupted, so the prefix survives
+            if stream and batch and not stream.append(batch):
+                stream = None
+            if stream and complete:
+                stream.finish()
+
+    def replay(self, stream, records, f, s, *args, **kwargs):
+        """ Yields the records of a cached stream, then resumes the
+        function if the stream was left incomplete. """
+        last = None
+        replayed = False
+        for last in records:
+            replayed = True
+            yield last
+
+        if stream.complete:
+            return
+
+        if replayed:
+            kwargs.update(self.resume(s, last))
+
+        debug.debug("Resuming interrupted cache stream {0}".format(stream.url))
+        for x in self.record(stream, f(s, *args, **kwargs)):
+            yield x
 
     def dump(self, path, payload):
         self.node = CACHE[path]
@@ -574,6 +1218,20 @@ class CacheDecorator(object):
             if payload:
                 return payload
 
+        ## Generators are cached as streams, an incomplete one is only
+        ## of use if we know how to resume the function
+        stream = CACHE.stream(path)
+        if stream:
+            state = stream.state()
+            if state == 'complete' or (state == 'partial' and self.resume):
+                try:
+                    records = stream.open()
+                except Exception, e:
+                    debug.debug("Discarding cache stream {0}: {1}".format(stream.url, e))
+                    stream.reset()
+                else:
+                    return self.replay(stream, records, f, s, *args, **kwargs)
+
         result = f(s, *args, **kwargs)
 
         ## If the wrapped function is a generator we need to
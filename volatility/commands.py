@@ -23,6 +23,7 @@ import volatility.fmtspec as fmtspec
 import volatility.obj as obj
 import volatility.registry as registry
 import volatility.addrspace as addrspace
+import volatility.renderers as renderers
 
 class Command(object):
     """ Base class for each plugin command """
@@ -43,6 +44,8 @@ class Command(object):
         """
         self._config = config
         self._formatlist = []
+        self._rowformats = []
+        self._profile = None
 
     @staticmethod
     def register_options(config):
@@ -83,6 +86,27 @@ class Command(object):
         some data, the function should return a generator.
         """
 
+    def unified_output(self, data):
+        """Returns a renderers.Table describing the results of calculate
+
+        Plugins implementing this get text, csv, jsonl and columnar
+        output from the renderers, unless they define a render_<format>
+        of their own.
+        """
+        raise NotImplementedError
+
+    def _unified_renderer(self, output):
+        """Returns the renderer for output if unified_output is the most
+        specific way this plugin produces it"""
+        renderer = renderers.RENDERERS.get(output)
+        if renderer is None:
+            return None
+        for cls in type(self).__mro__:
+            if "render_" + output in cls.__dict__:
+                return None
+            if "unified_output" in cls.__dict__:
+                return renderer if cls is not Command else None
+        return None
 
     def execute(self):
         """ Executes the plugin command."""
@@ -99,51 +123,44 @@ class Command(object):
         ## Then we render the result in some way based on the
         ## requested output mode:
         function_name = "render_{0}".format(self._config.OUTPUT)
-        if self._config.OUTPUT_FILE:
-            outfd = open(self._config.OUTPUT_FILE, 'w')
-            # TODO: We should probably check that this won't blat over an existing file 
-        else:
-            outfd = sys.stdout
-
-        try:
-            func = getattr(self, function_name)
-        except AttributeError:
+        renderer = self._unified_renderer(self._config.OUTPUT)
+        if renderer is None and not hasattr(self, function_name):
             ## Try to find out what formats are supported
             result = []
             for x in dir(self):
                 if x.startswith("render_"):
                     _a, b = x.split("_", 1)
                     result.append(b)
+            for b in renderers.RENDERERS:
+                if b not in result and self._unified_renderer(b):
+                    result.append(b)
 
             print "Plugin {0} is unable to produce output in format {1}. Supported formats are {2}. Please send a feature request".format(self.__class__.__name__, self._config.OUTPUT, result)
             return
 
-        func(outfd, data)
+        if self._config.OUTPUT_FILE:
+            outfd = open(self._config.OUTPUT_FILE, 'wb' if renderer and renderer.binary else 'w')
+            # TODO: We should probably check that this won't blat over an existing file 
+        else:
+            outfd = sys.stdout
+
+        if renderer:
+            renderer(self).render(outfd, self.unified_output(data))
+        else:
+            getattr(self, function_name)(outfd, data)
+
+        debug.debug("{0} NoneObjects were created".format(obj.NoneObject.created))
 
     def _formatlookup(self, profile, code):
         """Code to turn profile specific values into format specifications"""
-        code = code or ""
-        if not code.startswith('['):
-            return code
-
-        # Strip off the square brackets
-        code = code[1:-1].lower()
-        if code.startswith('addr'):
-            spec = fmtspec.FormatSpec("#10x")
-            if profile.metadata.get('memory_model', '32bit') == '64bit':
-                spec.minwidth += 8
-            if 'pad' in code:
-                spec.fill = "0"
-                spec.align = spec.align if spec.align else "="
-            else:
-                # Non-padded addresses will come out as numbers,
-                # so titles should align >
-                spec.align = ">"
-            return spec.to_string()
-
-        # Something went wrong
-        debug.warning("Unknown table format specification: " + code)
-        return ""
+        return renderers.format_lookup(profile, code)
+
+    def _table_profile(self):
+        """Returns the profile used to look up table formats"""
+        cached = getattr(self, "_profile", None)
+        if cached is None or cached[0] != self._config.PROFILE:
+            cached = self._profile = (self._config.PROFILE, addrspace.BufferAddressSpace(self._config).profile)
+        return cached[1]
 
     def _elide(self, string, length):
         """Adds three dots in the middle of a string if it is longer than length"""
@@ -166,8 +183,7 @@ class Command(object):
 
     def format_value(self, value, fmt):
         """ Formats an individual field using the table formatting codes"""
-        profile = addrspace.BufferAddressSpace(self._config).profile
-        return ("{0:" + self._formatlookup(profile, fmt) + "}").format(value)
+        return ("{0:" + self._formatlookup(self._table_profile(), fmt) + "}").format(value)
 
     def table_header(self, outfd, title_format_list = None):
         """Table header renders the title row of a table
@@ -179,7 +195,8 @@ class Command(object):
         titles = []
         rules = []
         self._formatlist = []
-        profile = addrspace.BufferAddressSpace(self._config).profile
+        self._rowformats = []
+        profile = self._table_profile()
 
         for (k, v) in title_format_list:
             spec = fmtspec.FormatSpec(self._formatlookup(profile, v))
@@ -195,6 +212,7 @@ class Command(object):
             titles.append(("{0:" + titlespec.to_string() + "}").format(k))
             rules.append("-" * titlespec.minwidth)
             self._formatlist.append(spec)
+            self._rowformats.append((("{0:" + spec.to_string() + "}").format, spec.minwidth))
 
         # Write out the titles and line rules
         if outfd:
@@ -203,11 +221,8 @@ class Command(object):
 
     def table_row(self, outfd, *args):
         """Outputs a single row of a table"""
-        reslist = []
-        if len(args) > len(self._formatlist):
+        if len(args) > len(self._rowformats):
             debug.error("Too many values for the table")
-        for index in range(len(args)):
-            spec = self._formatlist[index]
-            result = self._elide(("{0:" + spec.to_string() + "}").format(args[index]), spec.minwidth)
-            reslist.append(result)
-        outfd.write(self.tablesep.join(reslist) + "\n")
+        elide = self._elide
+        outfd.write(self.tablesep.join([elide(fmt(value), width)
+                                        for (fmt, width), value in zip(self._rowformats, args)]) + "\n")
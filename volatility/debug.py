@@ -43,9 +43,15 @@ def setup(level = 0):
     for i in range(1, 9):
         logging.addLevelName(logging.DEBUG - i, "DEBUG" + str(i))
 
+def enabled(level = 1):
+    """Returns whether debug messages of the given level will be shown"""
+    return logging.getLogger('').isEnabledFor(logging.DEBUG + 1 - level)
+
 def debug(msg, level = 1):
     """Logs a message at the DEBUG level"""
-    log(msg, logging.DEBUG + 1 - level)
+    # Finding the calling module is expensive, so don't unless it'll be shown
+    if enabled(level):
+        log(msg, logging.DEBUG + 1 - level)
 
 def info(msg):
     """Logs a message at the INFO level"""
@@ -34,7 +34,7 @@ if __name__ == '__main__':
     sys.path.append("..")
 
 import cPickle as pickle # pickle implementation must match that in volatility.cache
-import struct, copy, operator
+import struct, copy, operator, types
 import volatility.debug as debug
 import volatility.fmtspec as fmtspec
 import volatility.exceptions as exceptions
@@ -59,14 +59,34 @@ class NoneObject(object):
     """ A magical object which is like None but swallows bad
     dereferences, __getattribute__, iterators etc to return itself.
 
-    Instantiate with the reason for the error.
+    Instantiate with the reason for the error. Since these are created
+    on hot failure paths and the reason is rarely read, it's only
+    rendered on demand: the reason may be a format string followed by
+    its arguments, or a callable returning the reason.
     """
-    def __init__(self, reason = '', strict = False):
-        debug.debug("None object instantiated: " + reason, 2)
-        self.reason = reason
+    __slots__ = ('_reason', '_args', 'strict', 'bt', '__dict__')
+
+    # The number of NoneObjects created so far
+    created = 0
+
+    def __init__(self, reason = '', strict = False, *args):
+        NoneObject.created += 1
+        self._reason = reason
+        self._args = args
         self.strict = strict
         if strict:
             self.bt = get_bt_string()
+        if debug.enabled(2):
+            debug.debug("None object instantiated: " + self.reason, 2)
+
+    @property
+    def reason(self):
+        reason = self._reason
+        if callable(reason):
+            reason = reason()
+        elif self._args:
+            reason = reason.format(*self._args)
+        return reason
 
     def __str__(self):
         ## If we are strict we blow up here
@@ -175,8 +195,8 @@ def Object(theType, offset, vm, name = None, **kwargs):
             return result
     except InvalidOffsetError:
         ## If we cant instantiate the object here, we just error out:
-        return NoneObject("Invalid Address 0x{0:08X}, instantiating {1}".format(offset, name),
-                          strict = vm.profile.strict)
+        return NoneObject("Invalid Address 0x{0:08X}, instantiating {1}", vm.profile.strict,
+                          offset, name)
 
     ## If we get here we have no idea what the type is supposed to be?
     ## This is a serious error.
@@ -184,6 +204,12 @@ def Object(theType, offset, vm, name = None, **kwargs):
 
 class BaseObject(object):
 
+    # Millions of these get created, so the common attributes live in
+    # slots. __dict__ is kept so subclasses and newattr still work, but
+    # it's only allocated when something is actually stored in it.
+    __slots__ = ('_vol_theType', '_vol_offset', '_vol_vm', '_vol_native_vm',
+                 '_vol_parent', '_vol_name', '__dict__')
+
     # We have **kwargs here, but it's unclear if it's a good idea
     # Benefit is objects will never fail with duff parameters
     # Downside is typos won't show up and be difficult to diagnose
@@ -216,7 +242,11 @@ class BaseObject(object):
 
     @property
     def obj_name(self):
-        return self._vol_name
+        name = self._vol_name
+        # Array members defer formatting their name until it's needed
+        if type(name) is tuple:
+            return "{0} {1}".format(*name)
+        return name
 
     @property
     def obj_native_vm(self):
@@ -233,6 +263,19 @@ class BaseObject(object):
     def proxied(self, attr):
         return None
 
+    def snapshot(self):
+        """Reads the whole object from its address space at once
+
+        Members read afterwards are served from that copy instead of
+        each being translated and read on its own. This only applies
+        to address spaces that support prefetch(), and the copy is
+        only kept until a few other objects have been snapshotted.
+        """
+        prefetch = getattr(self.obj_vm, "prefetch", None)
+        if prefetch:
+            prefetch(self.obj_offset, self.size())
+        return self
+
     def newattr(self, attr, value):
         """Sets a new attribute after the object has been created"""
         return BaseObject.__setattr__(self, attr, value)
@@ -299,7 +342,7 @@ class BaseObject(object):
         return self.obj_vm.is_valid_address(self.obj_offset)
 
     def dereference(self):
-        return NoneObject("Can't dereference {0}".format(self.obj_name), self.obj_vm.profile.strict)
+        return NoneObject("Can't dereference {0}", self.obj_vm.profile.strict, self.obj_name)
 
     def dereference_as(self, derefType, **kwargs):
         # Make sure we use self.obj_native_vm to automatically
@@ -307,7 +350,7 @@ class BaseObject(object):
         if self.obj_native_vm.is_valid_address(self.v()):
             return Object(derefType, self.v(), self.obj_native_vm, parent = self, **kwargs)
         else:
-            return NoneObject("Invalid offset {0} for dereferencing {1} as {2}".format(self.v(), self.obj_name, derefType))
+            return NoneObject("Invalid offset {0} for dereferencing {1} as {2}", False, self.v(), self.obj_name, derefType)
 
     def cast(self, castString):
         return Object(castString, self.obj_offset, self.obj_vm)
@@ -315,7 +358,7 @@ class BaseObject(object):
     def v(self):
         """ Do the actual reading and decoding of this member
         """
-        return NoneObject("No value for {0}".format(self.obj_name), self.obj_vm.profile.strict)
+        return NoneObject("No value for {0}", self.obj_vm.profile.strict, self.obj_name)
 
     def __format__(self, formatspec):
         return format(self.v(), formatspec)
@@ -350,7 +393,7 @@ class BaseObject(object):
             for arg in self.__init__.func_code.co_varnames:
                 if (arg not in result and
                     arg not in "self parent profile args".split()):
-                    result[arg] = self.__dict__[arg]
+                    result[arg] = _instance_attribute(self, arg)
         except KeyError:
             debug.post_mortem()
             raise pickle.PicklingError("Object {0} at 0x{1:08x} cannot be cached because of missing attribute {2}".format(self.obj_name, self.obj_offset, arg))
@@ -370,6 +413,36 @@ class BaseObject(object):
         ## but must update the current object instead. I'm sure ikelos
         ## will object!!! I am open to suggestions ...
         self.__dict__ = new_object.__dict__
+        for slot in _slot_names(new_object.__class__):
+            try:
+                object.__setattr__(self, slot, object.__getattribute__(new_object, slot))
+            except AttributeError:
+                pass
+
+def _slot_names(cls):
+    """Returns the (mangled) names of all the slots of a class"""
+    result = []
+    for klass in cls.__mro__:
+        for slot in klass.__dict__.get('__slots__', ()):
+            if slot.startswith('__') and not slot.endswith('__'):
+                slot = '_' + klass.__name__.lstrip('_') + slot
+            if slot != '__dict__':
+                result.append(slot)
+    return result
+
+def _instance_attribute(item, attr):
+    """Returns an attribute stored on the instance, in a slot or its __dict__
+
+    Raises KeyError if the instance doesn't have it.
+    """
+    if attr in item.__dict__:
+        return item.__dict__[attr]
+    if isinstance(getattr(item.__class__, attr, None), types.MemberDescriptorType):
+        try:
+            return object.__getattribute__(item, attr)
+        except AttributeError:
+            pass
+    raise KeyError(attr)
 
 def CreateMixIn(mixin):
     def make_method(name):
@@ -398,6 +471,8 @@ def CreateMixIn(mixin):
 
 class NumericProxyMixIn(object):
     """ This MixIn implements the numeric protocol """
+    __slots__ = ()
+
     _specials = [
         ## Number protocols
         '__add__', '__sub__', '__mul__', '__floordiv__', '__mod__', '__divmod__',
@@ -419,6 +494,8 @@ class NumericProxyMixIn(object):
 CreateMixIn(NumericProxyMixIn)
 
 class NativeType(BaseObject, NumericProxyMixIn):
+    __slots__ = ('format_string',)
+
     def __init__(self, theType, offset, vm, format_string = None, **kwargs):
         BaseObject.__init__(self, theType, offset, vm, **kwargs)
         NumericProxyMixIn.__init__(self)
@@ -438,7 +515,7 @@ class NativeType(BaseObject, NumericProxyMixIn):
     def v(self):
         data = self.obj_vm.read(self.obj_offset, self.size())
         if not data:
-            return NoneObject("Unable to read {0} bytes from {1}".format(self.size(), self.obj_offset))
+            return NoneObject("Unable to read {0} bytes from {1}", False, self.size(), self.obj_offset)
 
         (val,) = struct.unpack(self.format_string, data)
 
@@ -480,6 +557,8 @@ class BitField(NativeType):
 
 
 class Pointer(NativeType):
+    __slots__ = ('target',)
+
     def __init__(self, theType, offset, vm, target = None, **kwargs):
         # Default to profile-endian address
         # We don't allow native_type overriding for pointers since we can't dereference invalid pointers anyway
@@ -512,7 +591,7 @@ class Pointer(NativeType):
                                  name = self.obj_name)
             return result
         else:
-            return NoneObject("Pointer {0} invalid".format(self.obj_name), self.obj_vm.profile.strict)
+            return NoneObject("Pointer {0} invalid", self.obj_vm.profile.strict, self.obj_name)
 
     def cdecl(self):
         return "Pointer {0}".format(self.v())
@@ -562,6 +641,8 @@ class Void(NativeType):
 
 class Array(BaseObject):
     """ An array of objects of the same size """
+    __slots__ = ('count', 'original_offset', 'target', 'current')
+
     def __init__(self, theType, offset, vm, parent = None,
                  count = 1, targetType = None, target = None, name = None, **kwargs):
         ## Instantiate the first object on the offset:
@@ -608,6 +689,29 @@ class Array(BaseObject):
 
             yield self[position]
 
+    def values(self):
+        """Returns the values of all the elements, rather than objects
+
+        Arrays of plain native types (ints, pointers etc) are read with
+        a single read and decoded with a single unpack. Other arrays,
+        and arrays that can't be read in one go, fall back to reading
+        each element, so unreadable elements come back as NoneObjects.
+        """
+        current = self.current
+        if isinstance(current, NativeType) and current.__class__.v.im_func is NativeType.v.im_func:
+            data = self.obj_vm.read(self.original_offset, self.size())
+            if data and len(data) == self.size():
+                fmt = current.format_string
+                if fmt[0] in "<>=!@":
+                    fmt = fmt[0] + fmt[1:] * self.count
+                else:
+                    fmt = fmt * self.count
+
+                # Integers are returned as longs, as NativeType.v does
+                return [long(x) if isinstance(x, int) else x for x in struct.unpack(fmt, data)]
+
+        return [x.v() for x in self]
+
     def __repr__(self):
         result = [ x.__str__() for x in self ]
         return "<Array {0}>".format(",".join(result))
@@ -652,10 +756,10 @@ class Array(BaseObject):
                                vm = self.obj_vm,
                                native_vm = self.obj_native_vm,
                                parent = self,
-                               name = "{0} {1}".format(self.obj_name, pos))
+                               name = (self.obj_name, pos))
         else:
-            return NoneObject("Array {0} invalid member {1}".format(self.obj_name, pos),
-                              self.obj_vm.profile.strict)
+            return NoneObject("Array {0} invalid member {1}", self.obj_vm.profile.strict,
+                              self.obj_name, pos)
 
     def __setitem__(self, pos, value):
         ## Get the item, then try writing to it
@@ -665,6 +769,8 @@ class Array(BaseObject):
 
 class CType(BaseObject):
     """ A CType is an object which represents a c struct """
+    __slots__ = ('members', 'struct_size', '__initialized')
+
     def __init__(self, theType, offset, vm, name = None, members = None, struct_size = 0, **kwargs):
         """ This must be instantiated with a dict of members. The keys
         are the offsets, the values are Curried Object classes that
@@ -737,17 +843,24 @@ class CType(BaseObject):
 
     def __setattr__(self, attr, value):
         """Change underlying members"""
+        # Slots are handled normally
+        if isinstance(getattr(self.__class__, attr, None), types.MemberDescriptorType):
+            return BaseObject.__setattr__(self, attr, value)
         # Special magic to allow initialization
-        if not self.__dict__.has_key('_CType__initialized'):  # this test allows attributes to be set in the __init__ method
+        try:
+            object.__getattribute__(self, '_CType__initialized')
+        except AttributeError:  # this test allows attributes to be set in the __init__ method
             return BaseObject.__setattr__(self, attr, value)
-        elif self.__dict__.has_key(attr):       # any normal attributes are handled normally
+        # Any normal attributes are handled normally. Members are
+        # checked first, since looking at __dict__ allocates it.
+        if attr not in self.members and attr in self.__dict__:
             return BaseObject.__setattr__(self, attr, value)
-        else:
-            obj = self.m(attr)
-            if hasattr(obj, 'write'):
-                if not obj.write(value):
-                    raise ValueError("Error writing value to member " + attr)
-                return
+
+        obj = self.m(attr)
+        if hasattr(obj, 'write'):
+            if not obj.write(value):
+                raise ValueError("Error writing value to member " + attr)
+            return
         # If you hit this, consider using obj.newattr('attr', value)
         raise ValueError("Attribute " + attr + " was set after object initialization")
 
@@ -828,6 +941,9 @@ class Profile(object):
     native_mapping = {'32bit': native_types.x86_native_types,
                       '64bit': native_types.x64_native_types}
 
+    # Compiled types of every profile constructed so far, by class and modifications
+    _compiled = {}
+
     def __init__(self, strict = False):
         self.strict = strict
         self._mods = []
@@ -863,6 +979,8 @@ class Profile(object):
         self.vtypes = {'VOLATILITY_MAGIC' : [0x0, {}]}
         # Clear out the ordering that modifications were applied (since now, none were)
         self._mods = []
+        # Forget any layouts worked out from the old types
+        self._layouts = {}
 
     def reset(self):
         """ Resets the profile's vtypes to those automatically loaded """
@@ -872,14 +990,34 @@ class Profile(object):
         self.load_vtypes()
         # Run through any modifications (new vtypes/overlays, object_classes)
         self.load_modifications()
-        # Recompile
-        self.compile()
+        # Recompile, unless the same profile has been compiled already
+        if not self.load_compiled():
+            self.compile()
+            self.save_compiled()
+
+    def load_compiled(self):
+        """Reuses the types compiled by an earlier instance of this profile
+
+        Compilation only depends on the profile and the modifications
+        applied to it, so instances with the same modifications can
+        share the result. Types are only ever replaced in a profile's
+        dictionary, never changed in place, so a copy of it is enough.
+        """
+        compiled = self._compiled.get((self.__class__, tuple(self._mods)), None)
+        if compiled is None:
+            return False
+        self.types = dict(compiled)
+        return True
+
+    def save_compiled(self):
+        """Stores the compiled types for later instances of this profile"""
+        self._compiled[(self.__class__, tuple(self._mods))] = dict(self.types)
 
     def load_vtypes(self):
         """ Identifies the module from which to load the vtypes 
         
-            Eventually this could do the importing directly, and avoid having
-            the profiles loaded in memory all at once.
+            The module is imported here on demand, so only the vtypes of
+            profiles that are actually used get loaded into memory.
         """
         ntvar = self.metadata.get('memory_model', '32bit')
         self.native_types = copy.deepcopy(self.native_mapping.get(ntvar))
@@ -888,6 +1026,8 @@ class Profile(object):
         if not vtype_module:
             debug.warning("No vtypes specified for this profile")
         else:
+            if vtype_module not in sys.modules:
+                __import__(vtype_module)
             module = sys.modules.get(vtype_module, None)
 
             # Try to locate the _types dictionary
@@ -937,6 +1077,7 @@ class Profile(object):
 
         # Load the native types
         self.types = {}
+        self._layouts = {}
         for nt, value in self.native_types.items():
             if type(value) == list:
                 self.types[nt] = Curry(NativeType, nt, format_string = value[1])
@@ -951,6 +1092,42 @@ class Profile(object):
             if name not in self.types:
                 self.types[name] = Curry(self.object_classes[name], name)
 
+        # Members are instantiated on every access, so resolve them to
+        # a single Curry now rather than going through Object() or a
+        # Curry of a Curry each time
+        for curry in self.types.values():
+            members = (getattr(curry, 'keywords', None) or {}).get('members')
+            if not members:
+                continue
+            for k, v in members.items():
+                if not callable(v):
+                    members[k] = (v[0], self._resolve_curry(v[1]))
+
+    def _resolve_curry(self, curry):
+        """Returns curry as a single Curry of the class it instantiates"""
+        if not isinstance(curry, Curry):
+            return curry
+
+        if curry.func is Object:
+            ## The deferred form, Curry(Object, theType, ...)
+            keywords = dict(curry.keywords or {})
+            args = curry.args
+            if args:
+                theType, args = args[0], args[1:]
+            else:
+                theType = keywords.pop('theType', None)
+            if args or theType not in self.types:
+                return curry
+            curry = Curry(self.types[theType], **keywords)
+
+        while isinstance(curry.func, Curry):
+            inner = curry.func
+            keywords = dict(inner.keywords or {})
+            keywords.update(curry.keywords or {})
+            curry = Curry(inner.func, *(inner.args + curry.args), **keywords)
+
+        return curry
+
     @property
     def metadata(self):
         """ Returns a read-only dictionary copy of the metadata associated with a profile """
@@ -993,22 +1170,46 @@ class Profile(object):
         """ Returns a simple check of whether the type is in the profile """
         return theType in self.types
 
+    ## Scanners ask for the same offsets and sizes for every hit, so
+    ## the answers are remembered until the profile is next compiled.
+
     def get_obj_offset(self, name, member):
         """ Returns a members offset within the struct """
+        key = ('offset', name, member)
+        try:
+            return self._layouts[key]
+        except KeyError:
+            pass
+
         tmp = self._get_dummy_obj(name)
         offset, _cls = tmp.members[member]
 
+        self._layouts[key] = offset
         return offset
 
     def get_obj_size(self, name):
         """Returns the size of a struct"""
+        key = ('size', name)
+        try:
+            return self._layouts[key]
+        except KeyError:
+            pass
+
         tmp = self._get_dummy_obj(name)
-        return tmp.size()
+        size = self._layouts[key] = tmp.size()
+        return size
 
     def obj_has_member(self, name, member):
         """Returns whether an object has a certain member"""
+        key = ('member', name, member)
+        try:
+            return self._layouts[key]
+        except KeyError:
+            pass
+
         tmp = self._get_dummy_obj(name)
-        return hasattr(tmp, member)
+        result = self._layouts[key] = hasattr(tmp, member)
+        return result
 
     def merge_overlay(self, overlay):
         """Applies an overlay to the profile's vtypes"""
@@ -22,7 +22,6 @@
 
 import volatility.plugins.addrspaces.paged as paged
 import volatility.obj as obj
-import struct
 
 
 ptrs_page = 2048
@@ -163,7 +162,7 @@ class AMD64PagedMemory(paged.AbstractWritablePagedMemory):
     def get_paddr(self, vaddr, pte):
         return self.pte_pfn(pte) | (vaddr & ((1 << page_shift) - 1))
 
-    def vtop(self, vaddr):
+    def page_walk(self, vaddr):
         '''
         This method translates an address in the virtual
         address space to its associated physical address.
@@ -202,13 +201,9 @@ class AMD64PagedMemory(paged.AbstractWritablePagedMemory):
 
         This code was derived directly from legacyintel.py
         '''
-        try:
-            string = self.base.read(addr, 8)
-        except IOError:
-            string = None
-        if not string:
-            return obj.NoneObject("Unable to read_long_long_phys at " + hex(addr))
-        (longlongval,) = struct.unpack('<Q', string)
+        longlongval = self.read_table_entry(addr, '<Q', 8)
+        if longlongval is None:
+            return obj.NoneObject("Unable to read_long_long_phys at {0:#x}", False, addr)
         return longlongval
 
     def get_available_pages(self):
@@ -222,34 +217,33 @@ class AMD64PagedMemory(paged.AbstractWritablePagedMemory):
         are accessible.
         '''
         
-        for pml4e in range(0, 0x200):
-            vaddr = pml4e << 39
-            pml4e_value = self.get_pml4e(vaddr)
-            if not self.entry_present(pml4e_value):
+        # Each paging structure is read and decoded as a whole, empty
+        # entries are skipped before the more expensive present check
+        pml4 = self.read_table(self.dtb & 0xffffffffff000, 'Q', 0x200)
+        for pml4e, pml4e_value in enumerate(pml4):
+            if not pml4e_value or not self.entry_present(pml4e_value):
                 continue
-            for pdpte in range(0, 0x200):
-                vaddr = (pml4e << 39) | (pdpte << 30)
-                pdpte_value = self.get_pdpi(vaddr, pml4e_value)
-                if not self.entry_present(pdpte_value):
+            pdpt = self.read_table(pml4e_value & 0xffffffffff000, 'Q', 0x200)
+            for pdpte, pdpte_value in enumerate(pdpt):
+                if not pdpte_value or not self.entry_present(pdpte_value):
                     continue
+                vaddr = (pml4e << 39) | (pdpte << 30)
                 if self.page_size_flag(pdpte_value):
                     yield (vaddr, 0x40000000)
                     continue
 
-                pgd_curr = self.pdba_base(pdpte_value)
-                for j in range(0, ptrs_per_pae_pgd):
+                pgd = self.read_table(self.pdba_base(pdpte_value), 'Q', ptrs_per_pae_pgd)
+                for j, entry in enumerate(pgd):
+                    if not entry or not self.entry_present(entry):
+                        continue
                     soffset = vaddr + (j * ptrs_per_pae_pgd * ptrs_per_pae_pte * 8)
-                    entry = self.read_long_long_phys(pgd_curr)
-                    pgd_curr = pgd_curr + 8
-                    if self.entry_present(entry) and self.page_size_flag(entry):
+                    if self.page_size_flag(entry):
                         yield (soffset, 0x200000)
-                    elif self.entry_present(entry):
-                        pte_curr = entry & 0xFFFFFFFFFF000
-                        for k in range(0, ptrs_per_pae_pte):
-                            pte_entry = self.read_long_long_phys(pte_curr)
-                            pte_curr = pte_curr + 8
-                            if self.entry_present(pte_entry):
-                                yield (soffset + k * 0x1000, 0x1000)
+                        continue
+                    pte_table = self.read_table(entry & 0xFFFFFFFFFF000, 'Q', ptrs_per_pae_pte)
+                    for k, pte_entry in enumerate(pte_table):
+                        if pte_entry and self.entry_present(pte_entry):
+                            yield (soffset + k * 0x1000, 0x1000)
 
     @classmethod
     def address_mask(cls, addr):
@@ -43,7 +43,7 @@ class ArmAddressSpace(paged.AbstractWritablePagedMemory):
         except IOError:
             string = None
         if not string:
-            return obj.NoneObject("Could not read_long_phys at offset " + hex(addr))
+            return obj.NoneObject("Could not read_long_phys at offset {0:#x}", False, addr)
         (longval,) = struct.unpack('<I', string)
         return longval
 
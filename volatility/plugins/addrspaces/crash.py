@@ -77,13 +77,14 @@ class WindowsCrashDumpSpace32(addrspace.AbstractRunBasedMemory):
         if file_addr is None:
             return False
 
+        self.drop_snapshots()
         return self.base.write(file_addr, buf)
 
     def read_long(self, addr):
         _baseaddr = self.translate(addr)
         string = self.read(addr, 4)
         if not string:
-            return obj.NoneObject("Could not read data at " + str(addr))
+            return obj.NoneObject("Could not read data at {0}", False, addr)
         (longval,) = struct.unpack('=I', string)
         return longval
 
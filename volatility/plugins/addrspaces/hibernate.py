@@ -24,8 +24,15 @@
 # this code in Volatility.
 
 """ A Hiber file Address Space """
+import os
+import array
+import bisect
+import hashlib
+import cPickle as pickle
 import volatility.addrspace as addrspace
 import volatility.obj as obj
+import volatility.debug as debug
+import volatility.cache as cache #pylint: disable-msg=W0611
 import volatility.win32.xpress as xpress
 import struct
 
@@ -35,25 +42,8 @@ import struct
 PAGE_SIZE = 0x1000
 page_shift = 12
 
-class Store(object):
-    def __init__(self, limit = 50):
-        self.limit = limit
-        self.cache = {}
-        self.seq = []
-        self.size = 0
-
-    def put(self, key, item):
-        self.cache[key] = item
-        self.size += len(item)
-
-        self.seq.append(key)
-        if len(self.seq) >= self.limit:
-            key = self.seq.pop(0)
-            self.size -= len(self.cache[key])
-            del self.cache[key]
-
-    def get(self, key):
-        return self.cache[key]
+## How many blocks are decompressed between reports of the block cache
+CACHE_REPORT_INTERVAL = 4096
 
 class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
     """ This is a hibernate address space for windows hibernation files.
@@ -69,12 +59,9 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
         self.as_assert(base, "No base Address Space")
         addrspace.BaseAddressSpace.__init__(self, base, config, **kwargs)
         self.runs = []
-        self.PageDict = {}
         self.HighestPage = 0
-        self.PageIndex = 0
         self.AddressList = []
-        self.LookupCache = {}
-        self.PageCache = Store(50)
+        self.PageCache = addrspace.BlockCache(config.HIBER_CACHE_MB * 1024 * 1024)
         self.MemRangeCnt = 0
         self.entry_count = 0xFF
 
@@ -101,9 +88,41 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
         ## need to search for it.
         self.dtb = self.ProcState.SpecialRegisters.Cr3.v()
 
-        # This is a lengthy process, it was cached, but it may be best to delay this
-        # until it's absolutely necessary and/or convert it into a generator...
-        self.build_page_cache()
+        ## The page index is built lazily, one memory range table at a
+        ## time as lookups need it. The first table is indexed now so
+        ## that a broken file is rejected here rather than mid-plugin.
+        self.index_complete = False
+        self.range_starts = []
+        self.range_info = []
+        self.block_offsets = array.array('L')
+        self.block_sizes = array.array('L')
+        self.table_walker = None
+        ## A completed index is only persisted once we have passed
+        ## all our assertions
+        self.validated = False
+        self.index_unsaved = False
+
+        if not self.load_page_index():
+            self.table_walker = self.walk_tables()
+            self.index_next_table(strict = True)
+
+        self.validated = True
+        if self.index_unsaved:
+            self.save_page_index()
+
+    @staticmethod
+    def register_options(config):
+        config.add_option("HIBER-CACHE-MB", type = 'int', default = 64,
+                          cache_invalidator = False,
+                          help = "Megabytes of decompressed hibernation blocks to cache")
+
+    def get_cache_stats(self):
+        """Returns the hit and miss counters of the decompressed block cache"""
+        return self.PageCache.get_stats()
+
+    def report_cache_stats(self):
+        debug.debug("Hibernation block cache: {hits} hits, {misses} misses, "
+                    "{evictions} evictions, {blocks} blocks held".format(**self.get_cache_stats()))
 
     def _get_first_table_page(self):
         if self.header != None:
@@ -113,8 +132,15 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
                 return i - 1
         return None
 
-    def build_page_cache(self):
-        XpressIndex = 0
+    def walk_tables(self):
+        """Indexes the _PO_MEMORY_RANGE_ARRAY tables, yielding after each one
+
+        Pages are numbered in the order they appear in a table, and
+        every 0x10 pages of a table are stored in one xpress block. So
+        rather than a tuple per page we only keep each range's first
+        page number within the index, plus the offset and size of
+        every xpress block.
+        """
         XpressHeader = obj.Object("_IMAGE_XPRESS_HEADER",
                                   (self._get_first_table_page() + 1) * 4096,
                                   self.base)
@@ -127,6 +153,11 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
             MemoryArray = obj.Object('_PO_MEMORY_RANGE_ARRAY', MemoryArrayOffset, self.base)
 
             EntryCount = MemoryArray.MemArrayLink.EntryCount.v()
+
+            ## The index of this table's first page
+            table_slot = len(self.block_offsets) * 0x10
+            XpressIndex = 0
+
             for i in MemoryArray.RangeTable:
                 start = i.StartPage.v()
                 end = i.EndPage.v()
@@ -138,26 +169,22 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
 
                 self.AddressList.append((start * 0x1000, LocalPageCnt * 0x1000))
 
-                for j in range(0, LocalPageCnt):
-                    if (XpressIndex and ((XpressIndex % 0x10) == 0)):
-                        XpressHeader, XpressBlockSize = \
-                                      self.next_xpress(XpressHeader, XpressBlockSize)
+                position = bisect.bisect_right(self.range_starts, start)
+                self.range_starts.insert(position, start)
+                self.range_info.insert(position, (LocalPageCnt, table_slot + XpressIndex))
+
+                XpressIndex += LocalPageCnt
 
-                    PageNumber = start + j
-                    XpressPage = XpressIndex % 0x10
-                    if XpressHeader.obj_offset not in self.PageDict:
-                        self.PageDict[XpressHeader.obj_offset] = [
-                            (PageNumber, XpressBlockSize, XpressPage)]
-                    else:
-                        self.PageDict[XpressHeader.obj_offset].append(
-                            (PageNumber, XpressBlockSize, XpressPage))
+            for block in range((XpressIndex + 0xF) / 0x10):
+                if block:
+                    XpressHeader, XpressBlockSize = \
+                                  self.next_xpress(XpressHeader, XpressBlockSize)
+                    self.as_assert(XpressHeader is not None, "Missing xpress block")
 
-                    ## Update the lookup cache
-                    self.LookupCache[PageNumber] = (
-                        XpressHeader.obj_offset, XpressBlockSize, XpressPage)
+                self.block_offsets.append(XpressHeader.obj_offset)
+                self.block_sizes.append(XpressBlockSize)
 
-                    self.PageIndex += 1
-                    XpressIndex += 1
+            yield
 
             NextTable = MemoryArray.MemArrayLink.NextTable.v()
 
@@ -167,16 +194,108 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
                 self.MemRangeCnt += 1
                 XpressHeader, XpressBlockSize = \
                                              self.next_xpress(XpressHeader, XpressBlockSize)
+                self.as_assert(XpressHeader is not None, "Missing xpress block")
 
                 # Make sure the xpress block is after the Memory Table
                 while (XpressHeader.obj_offset < MemoryArrayOffset):
                     XpressHeader, XpressBlockSize = \
                         self.next_xpress(XpressHeader, 0)
-
-                XpressIndex = 0
+                    self.as_assert(XpressHeader is not None, "Missing xpress block")
             else:
                 MemoryArrayOffset = 0
 
+    def index_next_table(self, strict = False):
+        """Indexes the next memory range table, returns False when there are none left
+
+        With strict set a broken table raises ASAssertionError,
+        otherwise it ends the index with a warning. Only an index
+        which was walked to its end is persisted.
+        """
+        if self.index_complete:
+            return False
+
+        try:
+            self.table_walker.next()
+            return True
+        except StopIteration:
+            self.index_unsaved = True
+        except addrspace.ASAssertionError, e:
+            if strict:
+                raise
+            debug.warning("Unable to index the rest of the hibernation file: {0}".format(e))
+
+        self.index_complete = True
+        self.table_walker = None
+        if self.index_unsaved and self.validated:
+            self.save_page_index()
+        return False
+
+    def build_page_cache(self):
+        """Indexes all the remaining memory range tables"""
+        while self.index_next_table():
+            pass
+
+    def _page_index_path(self):
+        """Returns the sidecar file the page index is persisted in, or None"""
+        fname = getattr(self.base, "fname", None)
+        if not fname or not self._config.CACHE:
+            return None
+        return os.path.join(self._config.CACHE_DIRECTORY, "hiberfil",
+                            hashlib.md5(repr(self._page_index_key()[:3])).hexdigest() + ".idx")
+
+    def _page_index_key(self):
+        ## The table layout depends on the profile, so an index built
+        ## while voting with another profile must not be reused
+        stat = os.stat(self.base.fname)
+        return (self.base.fname, self.profile.__class__.__name__,
+                self.profile.metadata.get('memory_model', '32bit'),
+                stat.st_size, stat.st_mtime)
+
+    def load_page_index(self):
+        """Loads a page index persisted by an earlier run, if it's still valid"""
+        path = self._page_index_path()
+        if not path or not os.access(path, os.R_OK):
+            return False
+
+        try:
+            index = pickle.load(open(path, "rb"))
+            if index['key'] != self._page_index_key():
+                return False
+            for attr in ['range_starts', 'range_info', 'block_offsets', 'block_sizes',
+                         'AddressList', 'HighestPage', 'MemRangeCnt']:
+                setattr(self, attr, index[attr])
+        except (EnvironmentError, pickle.UnpicklingError, EOFError, KeyError), e:
+            debug.debug("Unable to load hibernation page index {0}: {1}".format(path, e))
+            return False
+
+        self.index_complete = True
+        return True
+
+    def save_page_index(self):
+        """Persists the completed page index to its sidecar file"""
+        path = self._page_index_path()
+        if not path:
+            return
+
+        index = dict(key = self._page_index_key())
+        for attr in ['range_starts', 'range_info', 'block_offsets', 'block_sizes',
+                     'AddressList', 'HighestPage', 'MemRangeCnt']:
+            index[attr] = getattr(self, attr)
+
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            ## Write to a temporary file first so readers never see a
+            ## partial index
+            temp = path + ".tmp"
+            fd = open(temp, "wb")
+            pickle.dump(index, fd, 2)
+            fd.close()
+            os.rename(temp, path)
+            self.index_unsaved = False
+        except EnvironmentError, e:
+            debug.debug("Unable to save hibernation page index {0}: {1}".format(path, e))
+
     def next_xpress(self, XpressHeader, XpressBlockSize):
         XpressHeaderOffset = XpressBlockSize + XpressHeader.obj_offset + \
                              XpressHeader.size()
@@ -232,17 +351,22 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
 
     def get_addr(self, addr):
         page = addr >> page_shift
-        if page in self.LookupCache:
-            (hoffset, size, pageoffset) = self.LookupCache[page]
-            return hoffset, size, pageoffset
-        return None, None, None
+        while True:
+            i = bisect.bisect_right(self.range_starts, page) - 1
+            if i >= 0:
+                count, slot = self.range_info[i]
+                if page < self.range_starts[i] + count:
+                    slot += page - self.range_starts[i]
+                    block = slot / 0x10
+                    return self.block_offsets[block], self.block_sizes[block], slot % 0x10
+
+            ## The page may be in a table we haven't indexed yet
+            if not self.index_next_table():
+                return None, None, None
 
     def get_block_offset(self, _xb, addr):
-        page = addr >> page_shift
-        if page in self.LookupCache:
-            (_hoffset, _size, pageoffset) = self.LookupCache[page]
-            return pageoffset
-        return None
+        _hoffset, _size, pageoffset = self.get_addr(addr)
+        return pageoffset
 
     def is_valid_address(self, addr):
         XpressHeaderOffset, _XpressBlockSize, _XpressPage = self.get_addr(addr)
@@ -252,6 +376,8 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
         try:
             return self.PageCache.get(baddr)
         except KeyError:
+            if self.PageCache.misses % CACHE_REPORT_INTERVAL == 0:
+                self.report_cache_stats()
             data_read = self.base.read(baddr, BlockSize)
             if BlockSize == 0x10000:
                 data_uz = data_read
@@ -301,7 +427,7 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
         if result == '':
             if zread:
                 return ('\0' * length)
-            result = obj.NoneObject("Unable to read data at " + str(addr) + " for length " + str(length))
+            result = obj.NoneObject("Unable to read data at {0} for length {1}", False, addr, length)
 
         return result
 
@@ -313,19 +439,21 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
         _baseaddr = self.get_addr(addr)
         string = self.read(addr, 4)
         if not string:
-            return obj.NoneObject("Could not read long at " + str(addr))
+            return obj.NoneObject("Could not read long at {0}", False, addr)
         (longval,) = struct.unpack('=I', string)
         return longval
 
     def get_available_pages(self):
+        self.build_page_cache()
         page_list = []
-        for _i, xb in enumerate(self.PageDict.keys()):
-            for page, _size, _offset in self.PageDict[xb]:
+        for start, (count, _slot) in zip(self.range_starts, self.range_info):
+            for page in xrange(start, start + count):
                 page_list.append([page * 0x1000, 0x1000])
         return page_list
 
     def get_address_range(self):
         """ This relates to the logical address range that is indexable """
+        self.build_page_cache()
         size = self.HighestPage * 0x1000 + 0x1000
         return [0, size]
 
@@ -336,9 +464,11 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
 
     def get_available_addresses(self):
         """ This returns the ranges  of valid addresses """
+        self.build_page_cache()
         for i in self.AddressList:
             yield i
 
     def close(self):
+        self.report_cache_stats()
         self.base.close()
 
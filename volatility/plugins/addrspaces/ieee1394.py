@@ -201,6 +201,7 @@ class FirewireAddressSpace(addrspace.BaseAddressSpace):
         """Writes a specified size in bytes"""
         if not self._config.WRITE:
             return False
+        addrspace.note_write()
 
         ints = self.intervals(offset, len(data))
         try:
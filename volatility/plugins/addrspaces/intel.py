@@ -23,7 +23,6 @@
 # along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import struct
 import volatility.plugins.addrspaces.paged as paged
 import volatility.obj as obj
 
@@ -125,7 +124,7 @@ class IA32PagedMemory(paged.AbstractWritablePagedMemory):
     def get_four_meg_paddr(self, vaddr, pgd_entry):
         return (pgd_entry & ((ptrs_per_pgd - 1) << 22)) | (vaddr & ~((ptrs_per_pgd - 1) << 22))
 
-    def vtop(self, vaddr):
+    def page_walk(self, vaddr):
         retVal = None
         pgd = self.get_pgd(vaddr)
         if self.entry_present(pgd):
@@ -140,30 +139,26 @@ class IA32PagedMemory(paged.AbstractWritablePagedMemory):
         return retVal
 
     def read_long_phys(self, addr):
-        try:
-            string = self.base.read(addr, 4)
-        except IOError:
-            string = None
-        if not string:
-            return obj.NoneObject("Unable to read_long_phys at " + hex(addr))
-        (longval,) = struct.unpack('<I', string)
+        longval = self.read_table_entry(addr, '<I', 4)
+        if longval is None:
+            return obj.NoneObject("Unable to read_long_phys at {0:#x}", False, addr)
         return longval
 
     def get_available_pages(self):
-        pgd_curr = self.dtb
-        for i in range(0, ptrs_per_pgd):
+        # Each paging structure is read and decoded as a whole, empty
+        # entries are skipped before the more expensive present check
+        pgd = self.read_table(self.dtb, 'I', ptrs_per_pgd)
+        for i, entry in enumerate(pgd):
+            if not entry or not self.entry_present(entry):
+                continue
             start = (i * ptrs_per_pgd * ptrs_per_pte * 4)
-            entry = self.read_long_phys(pgd_curr)
-            pgd_curr = pgd_curr + 4
-            if self.entry_present(entry) and self.page_size_flag(entry):
+            if self.page_size_flag(entry):
                 yield (start, 0x400000)
-            elif self.entry_present(entry):
-                pte_curr = entry & ~((1 << page_shift) - 1)
-                for j in range(0, ptrs_per_pte):
-                    pte_entry = self.read_long_phys(pte_curr)
-                    pte_curr = pte_curr + 4
-                    if self.entry_present(pte_entry):
-                        yield (start + j * 0x1000, 0x1000)
+                continue
+            pte_table = self.read_table(entry & ~((1 << page_shift) - 1), 'I', ptrs_per_pte)
+            for j, pte_entry in enumerate(pte_table):
+                if pte_entry and self.entry_present(pte_entry):
+                    yield (start + j * 0x1000, 0x1000)
 
 class IA32PagedMemoryPae(IA32PagedMemory):
     """
@@ -228,7 +223,7 @@ class IA32PagedMemoryPae(IA32PagedMemory):
     def get_large_paddr(self, vaddr, pgd_entry):
         return (pgd_entry & 0xFFFFFFFE00000) | (vaddr & ~((ptrs_page - 1) << 21))
 
-    def vtop(self, vaddr):
+    def page_walk(self, vaddr):
         retVal = None
         pdpe = self.get_pdpi(vaddr)
 
@@ -247,40 +242,31 @@ class IA32PagedMemoryPae(IA32PagedMemory):
         return retVal
 
     def _read_long_long_phys(self, addr):
-        try:
-            string = self.base.read(addr, 8)
-        except IOError:
-            string = None
-        if not string:
-            return obj.NoneObject("Unable to read base AS at " + hex(addr))
-        (longlongval,) = struct.unpack('<Q', string)
+        longlongval = self.read_table_entry(addr, '<Q', 8)
+        if longlongval is None:
+            return obj.NoneObject("Unable to read base AS at {0:#x}", False, addr)
         return longlongval
 
     def get_available_pages(self):
 
-        pdpi_base = self.get_pdptb(self.dtb)
+        pdpi_table = self.read_table(self.get_pdptb(self.dtb), 'Q', ptrs_per_pdpi)
 
-        for i in range(0, ptrs_per_pdpi):
+        for i, pdpe in enumerate(pdpi_table):
 
-            start = (i * ptrs_per_pae_pgd * ptrs_per_pae_pgd * ptrs_per_pae_pte * 8)
-            pdpi_entry = pdpi_base + i * entry_size
-            pdpe = self._read_long_long_phys(pdpi_entry)
-
-            if not self.entry_present(pdpe):
+            if not pdpe or not self.entry_present(pdpe):
                 continue
 
-            pgd_curr = self.pdba_base(pdpe)
+            start = (i * ptrs_per_pae_pgd * ptrs_per_pae_pgd * ptrs_per_pae_pte * 8)
+            pgd = self.read_table(self.pdba_base(pdpe), 'Q', ptrs_per_pae_pgd)
 
-            for j in range(0, ptrs_per_pae_pgd):
+            for j, entry in enumerate(pgd):
+                if not entry or not self.entry_present(entry):
+                    continue
                 soffset = start + (j * ptrs_per_pae_pgd * ptrs_per_pae_pte * 8)
-                entry = self._read_long_long_phys(pgd_curr)
-                pgd_curr = pgd_curr + 8
-                if self.entry_present(entry) and self.page_size_flag(entry):
+                if self.page_size_flag(entry):
                     yield (soffset, 0x200000)
-                elif self.entry_present(entry):
-                    pte_curr = entry & ~((1 << page_shift) - 1)
-                    for k in range(0, ptrs_per_pae_pte):
-                        pte_entry = self._read_long_long_phys(pte_curr)
-                        pte_curr = pte_curr + 8
-                        if self.entry_present(pte_entry):
-                            yield (soffset + k * 0x1000, 0x1000)
+                    continue
+                pte_table = self.read_table(entry & ~((1 << page_shift) - 1), 'Q', ptrs_per_pae_pte)
+                for k, pte_entry in enumerate(pte_table):
+                    if pte_entry and self.entry_present(pte_entry):
+                        yield (soffset + k * 0x1000, 0x1000)
@@ -18,6 +18,7 @@
 #
 
 #import fractions
+import struct
 import volatility.addrspace as addrspace
 import volatility.obj as obj
 
@@ -28,10 +29,21 @@ class AbstractPagedMemory(addrspace.AbstractVirtualAddressSpace):
     """
     checkname = "Intel"
 
+    ## Maximum number of translations held in the TLB and of page
+    ## table pages held in the table cache. Both are flushed when full.
+    tlb_size = 0x4000
+    table_cache_size = 64
+
     def __init__(self, base, config, dtb = 0, skip_as_check = False, *args, **kwargs):
         ## We must be stacked on someone else:
         self.as_assert(base, "No base Address Space")
 
+        ## The caches must exist before the address space check below
+        ## starts translating addresses
+        self.flush_tlb()
+        self.tlb_hits = self.tlb_misses = 0
+        self.table_hits = self.table_misses = 0
+
         addrspace.AbstractVirtualAddressSpace.__init__(self, base, config, *args, **kwargs)
 
         ## We can not stack on someone with a dtb
@@ -83,10 +95,103 @@ class AbstractPagedMemory(addrspace.AbstractVirtualAddressSpace):
         config.add_option("DTB", type = 'int', default = 0,
                           help = "DTB Address")
 
-    def vtop(self, addr):
-        """Abstract function that converts virtual (paged) addresses to physical addresses"""
+    def read_table(self, addr, fmt, count):
+        """Reads a whole paging structure of count entries at once
+
+        The table is read with a single base read and decoded with a
+        single unpack. If the table can't be read in one go, each
+        entry is read on its own and unreadable entries are returned
+        as 0 (not present).
+        """
+        size = struct.calcsize(fmt)
+        try:
+            data = self.base.read(addr, size * count)
+        except IOError:
+            data = None
+
+        if data and len(data) == size * count:
+            return struct.unpack("<" + fmt * count, data)
+
+        return [self.read_table_entry(addr + i * size, "<" + fmt, size) or 0 for i in xrange(count)]
+
+    def vtop(self, vaddr):
+        """Converts virtual (paged) addresses to physical addresses
+
+        Translations are cached per virtual page, so only the first
+        access to a page has to walk the paging structures.
+        """
+        if not isinstance(vaddr, (int, long)):
+            return self.page_walk(vaddr)
+
+        vpn = vaddr >> 12
+        try:
+            frame = self.tlb[vpn]
+            self.tlb_hits += 1
+        except KeyError:
+            self.tlb_misses += 1
+            frame = self.page_walk(vpn << 12)
+            if frame is not None:
+                frame = int(frame)
+
+            if len(self.tlb) >= self.tlb_size:
+                self.tlb.clear()
+            self.tlb[vpn] = frame
+
+        if frame is None:
+            return None
+        return frame | (vaddr & 0xfff)
+
+    def page_walk(self, vaddr):
+        """Abstract function that walks the paging structures to convert a
+        virtual address to a physical address, without using the TLB"""
         pass
 
+    def flush_tlb(self):
+        """Empties the translation and page table caches"""
+        self.tlb = {}
+        self.table_cache = {}
+
+    def get_tlb_stats(self):
+        """Returns the hit and miss counters of the TLB and table cache"""
+        return dict(tlb_hits = self.tlb_hits, tlb_misses = self.tlb_misses,
+                    table_hits = self.table_hits, table_misses = self.table_misses)
+
+    def read_table_entry(self, addr, fmt, size):
+        """Reads a paging structure entry from the physical address space
+
+        The whole page table containing the entry is read at once and
+        kept in the table cache, since neighbouring entries are likely
+        to be needed soon. Returns None if the entry can't be read.
+        """
+        page = addr & ~0xfff
+        try:
+            data = self.table_cache[page]
+            self.table_hits += 1
+        except KeyError:
+            self.table_misses += 1
+            try:
+                data = self.base.read(page, 0x1000)
+            except IOError:
+                data = None
+
+            if len(self.table_cache) >= self.table_cache_size:
+                self.table_cache.clear()
+            self.table_cache[page] = data
+
+        offset = addr - page
+        if data and len(data) >= offset + size:
+            return struct.unpack_from(fmt, data, offset)[0]
+
+        ## Fall back to reading the entry on its own in case only
+        ## part of the page is available
+        try:
+            data = self.base.read(addr, size)
+        except IOError:
+            data = None
+        if not data or len(data) != size:
+            return None
+        return struct.unpack(fmt, data)[0]
+
     def get_available_pages(self):
         """A generator that returns (addr, size) for each of the virtual addresses present, sorted by offset"""
         pass
@@ -157,6 +262,9 @@ class AbstractWritablePagedMemory(AbstractPagedMemory):
             result = self.base.write(paddr, buf[:datalen])
             if not result:
                 return False
+            ## The write may have modified the paging structures
+            self.flush_tlb()
+            self.drop_snapshots()
             buf = buf[datalen:]
             position += datalen
             remaining -= datalen
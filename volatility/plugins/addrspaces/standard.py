@@ -28,6 +28,7 @@ import struct
 import volatility.addrspace as addrspace
 import volatility.debug as debug #pylint: disable-msg=W0611
 import urllib
+import mmap
 import os
 
 #pylint: disable-msg=C0111
@@ -84,24 +85,54 @@ class FileAddressSpace(addrspace.BaseAddressSpace):
         self.fhandle.seek(0, 2)
         self.fsize = self.fhandle.tell()
 
+        ## Read-only images are memory mapped so reads are served as
+        ## slices of the mapping rather than a seek and read each
+        self.mapping = None
+        if not config.WRITE and not config.NO_MMAP and self.fsize:
+            try:
+                self.mapping = mmap.mmap(self.fhandle.fileno(), 0, access = mmap.ACCESS_READ)
+            except (EnvironmentError, ValueError, OverflowError), e:
+                debug.debug("Unable to memory map {0}: {1}".format(self.fname, e))
+
     # Abstract Classes cannot register options, and since this checks config.WRITE in __init__, we define the option here
     @staticmethod
     def register_options(config):
         config.add_option("WRITE", short_option = 'w', action = "callback", default = False,
                           help = "Enable write support", callback = write_callback)
 
+        config.add_option("NO-MMAP", action = "store_true", default = False,
+                          cache_invalidator = False,
+                          help = "Read file images without memory mapping them")
+
     def fread(self, length):
         length = int(length)
         return self.fhandle.read(length)
 
     def read(self, addr, length):
         addr, length = int(addr), int(length)
-        self.fhandle.seek(addr)
-        data = self.fhandle.read(length)
+        if self.mapping is not None:
+            if addr < 0:
+                ## Match the IOError a negative seek would raise
+                raise IOError("Invalid argument: negative offset")
+            data = self.mapping[addr:addr + length]
+        else:
+            self.fhandle.seek(addr)
+            data = self.fhandle.read(length)
         if len(data) == 0:
             return None
         return data
 
+    def read_buffer(self, addr, length):
+        """Returns a read-only buffer over the data at addr without copying it
+
+        The buffer may be shorter than length at the end of the file.
+        Without a memory mapping this falls back to a normal read.
+        """
+        addr, length = int(addr), int(length)
+        if self.mapping is None or addr < 0 or addr >= self.fsize:
+            return buffer(self.read(addr, length) or '')
+        return buffer(self.mapping, addr, min(length, self.fsize - addr))
+
     def zread(self, addr, length):
         data = self.read(addr, length)
         if data is None:
@@ -126,11 +157,15 @@ class FileAddressSpace(addrspace.BaseAddressSpace):
         return 0 <= addr < self.fsize
 
     def close(self):
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
         self.fhandle.close()
 
     def write(self, addr, data):
         if not self._config.WRITE:
             return False
+        addrspace.note_write()
         try:
             self.fhandle.seek(addr)
             self.fhandle.write(data)
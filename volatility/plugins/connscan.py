@@ -67,7 +67,15 @@ class ConnScan(common.AbstractWindowsCommand):
         return (profile.metadata.get('os', 'unknown') == 'windows' and
                 profile.metadata.get('major', 0) == 5)
 
-    @cache.CacheDecorator("scans/connscan2")
+    @cache.CacheDecorator("scans/connscan2", resume = cache.resume_after_offset)
+    def scan_offsets(self, offset = 0):
+        """Yields the physical offsets of the _TCPT_OBJECTs found"""
+        address_space = utils.load_as(self._config, astype = 'physical')
+
+        scanner = PoolScanConnFast()
+        for found in scanner.scan(address_space, offset):
+            yield found
+
     def calculate(self):
         ## Just grab the AS and scan it using our scanner
         address_space = utils.load_as(self._config, astype = 'physical')
@@ -75,11 +83,10 @@ class ConnScan(common.AbstractWindowsCommand):
         if not self.is_valid_profile(address_space.profile):
             debug.error("This command does not support the selected profile.")
 
-        scanner = PoolScanConnFast()
-        for offset in scanner.scan(address_space):
-            ## This yields the pool offsets - we want the actual object
+        for found in self.scan_offsets():
+            ## These are the pool offsets - we want the actual object
             tcp_obj = obj.Object('_TCPT_OBJECT', vm = address_space,
-                                offset = offset)
+                                offset = found)
             yield tcp_obj
 
     def render_text(self, outfd, data):
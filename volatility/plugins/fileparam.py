@@ -42,6 +42,6 @@ def set_location(_option, _opt_str, value, parser):
         parser.values.location = "file:" + slashes + urllib.pathname2url(os.path.abspath(value))
 
 config.add_option("FILENAME", default = None, action = "callback",
-                  callback = set_location, type = 'str',
+                  callback = set_location, type = 'str', cache_invalidator = False,
                   short_option = 'f', nargs = 1,
                   help = "Filename to use when opening an image")
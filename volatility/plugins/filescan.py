@@ -26,6 +26,7 @@
 """
 
 import volatility.scan as scan
+import volatility.cache as cache
 import volatility.plugins.common as common
 import volatility.debug as debug #pylint: disable-msg=W0611
 import volatility.utils as utils
@@ -52,35 +53,38 @@ class FileScan(common.AbstractWindowsCommand):
     meta_info['os'] = 'WIN_32_XP_SP2'
     meta_info['version'] = '0.1'
 
-    # Can't be cached until self.kernel_address_space is moved entirely within calculate
-    def calculate(self):
-        ## Just grab the AS and scan it using our scanner
-        address_space = utils.load_as(self._config, astype = 'physical')
+    def file_objects(self, address_space, kernel_as, offset):
+        """Returns the _OBJECT_HEADER and _FILE_OBJECT of the pool allocation at offset"""
+        pool_obj = obj.Object("_POOL_HEADER", vm = address_space,
+                             offset = offset)
 
-        ## Will need the kernel AS for later:
-        kernel_as = utils.load_as(self._config)
+        ## We work out the _FILE_OBJECT from the end of the
+        ## allocation (bottom up).
+        pool_alignment = obj.VolMagic(address_space).PoolAlignment.v()
 
-        for offset in PoolScanFile().scan(address_space):
+        file_obj = obj.Object("_FILE_OBJECT", vm = address_space,
+                 offset = (offset + pool_obj.BlockSize * pool_alignment -
+                 common.pool_align(kernel_as, "_FILE_OBJECT", pool_alignment)),
+                 native_vm = kernel_as
+                 )
 
-            pool_obj = obj.Object("_POOL_HEADER", vm = address_space,
-                                 offset = offset)
+        ## The _OBJECT_HEADER is immediately below the _FILE_OBJECT
+        object_obj = obj.Object("_OBJECT_HEADER", vm = address_space,
+                               offset = file_obj.obj_offset -
+                               address_space.profile.get_obj_offset('_OBJECT_HEADER', 'Body'),
+                               native_vm = kernel_as
+                               )
 
-            ## We work out the _FILE_OBJECT from the end of the
-            ## allocation (bottom up).
-            pool_alignment = obj.VolMagic(address_space).PoolAlignment.v()
+        return object_obj, file_obj
 
-            file_obj = obj.Object("_FILE_OBJECT", vm = address_space,
-                     offset = (offset + pool_obj.BlockSize * pool_alignment -
-                     common.pool_align(kernel_as, "_FILE_OBJECT", pool_alignment)),
-                     native_vm = kernel_as
-                     )
+    @cache.CacheDecorator("scans/filescan", resume = cache.resume_after_offset)
+    def scan_offsets(self, offset = 0):
+        """Yields the offsets of the pool allocations holding file objects"""
+        address_space = utils.load_as(self._config, astype = 'physical')
+        kernel_as = utils.load_as(self._config)
 
-            ## The _OBJECT_HEADER is immediately below the _FILE_OBJECT
-            object_obj = obj.Object("_OBJECT_HEADER", vm = address_space,
-                                   offset = file_obj.obj_offset -
-                                   address_space.profile.get_obj_offset('_OBJECT_HEADER', 'Body'),
-                                   native_vm = kernel_as
-                                   )
+        for offset in PoolScanFile().scan(address_space, offset):
+            object_obj, file_obj = self.file_objects(address_space, kernel_as, offset)
 
             if object_obj.get_object_type() != "File":
                 continue
@@ -89,7 +93,17 @@ class FileScan(common.AbstractWindowsCommand):
             if not file_obj.FileName.v():
                 continue
 
-            yield (object_obj, file_obj)
+            yield offset
+
+    def calculate(self):
+        ## Just grab the AS and scan it using our scanner
+        address_space = utils.load_as(self._config, astype = 'physical')
+
+        ## Will need the kernel AS for later:
+        kernel_as = utils.load_as(self._config)
+
+        for offset in self.scan_offsets():
+            yield self.file_objects(address_space, kernel_as, offset)
 
     def render_text(self, outfd, data):
 
@@ -415,14 +429,20 @@ class PSScan(common.AbstractWindowsCommand):
     meta_info['os'] = ['Win7SP0x86', 'WinXPSP3x86']
     meta_info['version'] = '0.1'
 
-    # Can't be cached until self.kernel_address_space is moved entirely
-    # within calculate
+    @cache.CacheDecorator("scans/psscan", resume = cache.resume_after_offset)
+    def scan_offsets(self, offset = 0):
+        """Yields the physical offsets of the _EPROCESS objects found"""
+        address_space = utils.load_as(self._config, astype = 'physical')
+
+        for offset in PoolScanProcess().scan(address_space, offset):
+            yield offset
+
     def calculate(self):
         ## Just grab the AS and scan it using our scanner
         address_space = utils.load_as(self._config, astype = 'physical')
         kernel_as = utils.load_as(self._config)
 
-        for offset in PoolScanProcess().scan(address_space):
+        for offset in self.scan_offsets():
             eprocess = obj.Object('_EPROCESS', vm = address_space,
                                   native_vm = kernel_as, offset = offset)
             yield eprocess
@@ -19,7 +19,6 @@
 #
 
 import volatility.obj as obj
-import volatility.plugins.gui.vtypes.win7_sp0_x64_vtypes_gui as win7_sp0_x64_vtypes_gui
 import volatility.plugins.gui.constants as consts
 
 class Vista2008x64GuiVTypes(obj.ProfileModification):
@@ -32,6 +31,8 @@ class Vista2008x64GuiVTypes(obj.ProfileModification):
                   'minor': lambda x: x == 0}
 
     def modification(self, profile):
+        import volatility.plugins.gui.vtypes.win7_sp0_x64_vtypes_gui as win7_sp0_x64_vtypes_gui
+
         # Enough stayed the same between Vista/2008 and Windows 7, 
         ## so we can re-use the Windows 7 types. This is a bit unconventional
         ## because we typically when we re-use, we do it forward (i.e. use 
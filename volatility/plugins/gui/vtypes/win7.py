@@ -21,10 +21,6 @@
 import volatility.obj as obj
 import volatility.plugins.gui.constants as consts
 import volatility.plugins.gui.win32k_core as win32k_core
-import volatility.plugins.gui.vtypes.win7_sp0_x64_vtypes_gui as win7_sp0_x64_vtypes_gui
-import volatility.plugins.gui.vtypes.win7_sp0_x86_vtypes_gui as win7_sp0_x86_vtypes_gui
-import volatility.plugins.gui.vtypes.win7_sp1_x64_vtypes_gui as win7_sp1_x64_vtypes_gui
-import volatility.plugins.gui.vtypes.win7_sp1_x86_vtypes_gui as win7_sp1_x86_vtypes_gui
 
 class Win7SP0x64GuiVTypes(obj.ProfileModification):
     """Apply the base vtypes for Windows 7 SP0 x64"""
@@ -36,6 +32,7 @@ class Win7SP0x64GuiVTypes(obj.ProfileModification):
                   'build': lambda x : x == 7600}
 
     def modification(self, profile):
+        import volatility.plugins.gui.vtypes.win7_sp0_x64_vtypes_gui as win7_sp0_x64_vtypes_gui
         profile.vtypes.update(win7_sp0_x64_vtypes_gui.win32k_types)
 
 class Win7SP1x64GuiVTypes(obj.ProfileModification):
@@ -48,6 +45,7 @@ class Win7SP1x64GuiVTypes(obj.ProfileModification):
                   'build': lambda x : x == 7601}
 
     def modification(self, profile):
+        import volatility.plugins.gui.vtypes.win7_sp1_x64_vtypes_gui as win7_sp1_x64_vtypes_gui
         profile.vtypes.update(win7_sp1_x64_vtypes_gui.win32k_types)
 
 class Win7SP0x86GuiVTypes(obj.ProfileModification):
@@ -60,6 +58,7 @@ class Win7SP0x86GuiVTypes(obj.ProfileModification):
                   'build': lambda x : x == 7600}
 
     def modification(self, profile):
+        import volatility.plugins.gui.vtypes.win7_sp0_x86_vtypes_gui as win7_sp0_x86_vtypes_gui
         profile.vtypes.update(win7_sp0_x86_vtypes_gui.win32k_types)
 
 class Win7SP1x86GuiVTypes(obj.ProfileModification):
@@ -72,6 +71,7 @@ class Win7SP1x86GuiVTypes(obj.ProfileModification):
                   'build': lambda x : x == 7601}
 
     def modification(self, profile):
+        import volatility.plugins.gui.vtypes.win7_sp1_x86_vtypes_gui as win7_sp1_x86_vtypes_gui
         profile.vtypes.update(win7_sp1_x86_vtypes_gui.win32k_types)
 
 class Win7GuiOverlay(obj.ProfileModification):
@@ -21,6 +21,7 @@
 #
 
 import volatility.plugins.taskmods as taskmods
+import volatility.renderers as renderers
 
 # Inherit from Dlllist for command line options
 class Handles(taskmods.DllList):
@@ -36,18 +37,19 @@ class Handles(taskmods.DllList):
         config.add_option("SILENT", short_option = 's', default = False,
                           action = 'store_true', help = 'Suppress less meaningful results')
 
-    def render_text(self, outfd, data):
+    def unified_output(self, data):
         offsettype = "(V)" if not self._config.PHYSICAL_OFFSET else "(P)"
 
-        self.table_header(outfd,
-                          [("Offset{0}".format(offsettype), "[addrpad]"),
-                           ("Pid", ">6"),
-                           ("Handle", "[addr]"),
-                           ("Access", "[addr]"),
-                           ("Type", "16"),
-                           ("Details", "")
-                           ])
+        return renderers.Table(
+                          [renderers.Column("Offset{0}".format(offsettype), renderers.Address, "[addrpad]"),
+                           renderers.Column("Pid", int, ">6"),
+                           renderers.Column("Handle", renderers.Address, "[addr]"),
+                           renderers.Column("Access", renderers.Address, "[addr]"),
+                           renderers.Column("Type", str, "16"),
+                           renderers.Column("Details", str, "")
+                           ], self.generator(data))
 
+    def generator(self, data):
         if self._config.OBJECT_TYPE:
             object_list = [s for s in self._config.OBJECT_TYPE.split(',')]
         else:
@@ -64,7 +66,7 @@ class Handles(taskmods.DllList):
             else:
                 offset = handle.obj_vm.vtop(handle.Body.obj_offset)
 
-            self.table_row(outfd, offset, pid, handle.HandleValue, handle.GrantedAccess, object_type, name)
+            yield offset, pid, handle.HandleValue, handle.GrantedAccess, object_type, name
 
     def calculate(self):
 
@@ -20,10 +20,65 @@
 #
 
 import os
+import time
 import volatility.debug as debug
 import volatility.utils as utils
+import volatility.scan as scan
 import volatility.plugins.common as common
 
+## Runs of zeros at least this long are skipped instead of written
+SPARSE_SIZE = 0x10000
+
+## Amount of data written between syncs of the image and its progress file
+SYNC_SIZE = 0x10000000
+
+class SparseWriter(object):
+    """Writes blocks to a file, seeking over runs of zeros rather than writing them"""
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.size = os.fstat(fd).st_size
+        self.written = 0
+        self.skipped = 0
+        self.zeros = "\x00" * SPARSE_SIZE
+
+    def write(self, offset, data):
+        run = None
+        for pos in xrange(0, len(data), SPARSE_SIZE):
+            piece = data[pos:pos + SPARSE_SIZE]
+            if piece == self.zeros[:len(piece)]:
+                if run is not None:
+                    self._write(offset + run, data[run:pos])
+                    run = None
+                self.skipped += len(piece)
+            elif run is None:
+                run = pos
+
+        if run is not None:
+            self._write(offset + run, data[run:])
+
+        ## Grow the file over a trailing hole so readers see its full size
+        end = offset + len(data)
+        if end > self.size:
+            if hasattr(os, "ftruncate"):
+                os.ftruncate(self.fd, end)
+            else:
+                ## Windows python has no ftruncate, writing the last
+                ## byte extends the file just the same
+                os.lseek(self.fd, end - 1, 0)
+                os.write(self.fd, "\x00")
+            self.size = end
+
+    def _write(self, offset, data):
+        os.lseek(self.fd, offset, 0)
+        self.written += len(data)
+        self.size = max(self.size, offset + len(data))
+        while data:
+            data = data[os.write(self.fd, data):]
+
+    def sync(self):
+        os.fsync(self.fd)
+
 class ImageCopy(common.AbstractWindowsCommand):
     """Copies a physical address space out as a raw DD image"""
 
@@ -35,14 +90,45 @@ class ImageCopy(common.AbstractWindowsCommand):
         self._config.add_option("OUTPUT-IMAGE", short_option = "O", default = None,
                                 help = "Writes a raw DD image out to OUTPUT-IMAGE",
                                 action = 'store', type = 'str')
+        self._config.add_option("RESUME", default = False, action = 'store_true',
+                                help = "Continue an interrupted copy to OUTPUT-IMAGE")
 
     def calculate(self):
-        blocksize = self._config.BLOCKSIZE
         addr_space = utils.load_as(self._config, astype = 'physical')
 
-        for s, l in addr_space.get_available_addresses():
-            for i in range(s, s + l, blocksize):
-                yield i, addr_space.zread(i, min(blocksize, s + l - i))
+        for block in self.read_blocks(addr_space):
+            yield block
+
+    def read_blocks(self, addr_space, shift = 0, method = 'zread'):
+        """Yields the blocks of addr_space which still have to be written,
+        their offsets moved up by shift"""
+        done = self.resume_offset()
+        chunks = [(start, end) for start, end in scan.iter_chunks(addr_space, chunk_size = self._config.BLOCKSIZE)
+                  if end + shift > done]
+
+        for offset, data in scan.parallel_read(addr_space, chunks, method, self._config.PARALLEL):
+            yield offset + shift, data
+
+    def progress_filename(self):
+        return self._config.OUTPUT_IMAGE + ".progress"
+
+    def resume_offset(self):
+        """Returns the offset up to which an interrupted copy was written"""
+        if not self._config.RESUME or not self._config.OUTPUT_IMAGE:
+            return 0
+        try:
+            return int(open(self.progress_filename()).read())
+        except (IOError, ValueError):
+            return 0
+
+    def save_progress(self, offset):
+        filename = self.progress_filename()
+        fd = open(filename + ".tmp", "w")
+        fd.write(str(offset))
+        fd.close()
+        if os.name == 'nt' and os.path.exists(filename):
+            os.remove(filename)
+        os.rename(filename + ".tmp", filename)
 
     def human_readable(self, value):
         for i in ['B', 'KB', 'MB', 'GB']:
@@ -56,24 +142,49 @@ class ImageCopy(common.AbstractWindowsCommand):
         if self._config.OUTPUT_IMAGE is None:
             debug.error("Please provide an output-image filename")
 
-        if os.path.exists(self._config.OUTPUT_IMAGE) and (os.path.getsize(self._config.OUTPUT_IMAGE) > 1):
+        resume = self.resume_offset()
+        if resume:
+            outfd.write("Resuming copy from offset {0:#x}\n".format(resume))
+        elif os.path.exists(self._config.OUTPUT_IMAGE) and (os.path.getsize(self._config.OUTPUT_IMAGE) > 1):
             debug.error("Refusing to overwrite an existing file, please remove it before continuing")
 
         outfd.write("Writing data (" + self.human_readable(self._config.BLOCKSIZE) + " chunks): |")
-        f = file(self._config.OUTPUT_IMAGE, "wb+")
-        progress = 0
+        fd = os.open(self._config.OUTPUT_IMAGE, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0666)
+        writer = SparseWriter(fd)
+        progress = resume
+        unsynced = 0
+        start = time.time()
         try:
             for o, block in data:
-                f.seek(o)
-                f.write(block)
-                f.flush()
+                writer.write(o, block)
                 outfd.write(".")
                 outfd.flush()
-                progress = o
-        except TypeError:
-            debug.error("Error when reading from address space")
+                progress = o + len(block)
+
+                ## Only record progress once the data is on disk
+                unsynced += len(block)
+                if unsynced >= SYNC_SIZE:
+                    writer.sync()
+                    self.save_progress(progress)
+                    unsynced = 0
         except BaseException, e:
-            debug.error("Unexpected error ({1}) during copy, recorded data up to offset {0:0x}".format(progress, str(e)))
+            ## Whatever stopped the copy, keep what was written so far
+            writer.sync()
+            self.save_progress(progress)
+            if isinstance(e, TypeError):
+                reason = "Error when reading from address space"
+            else:
+                reason = "Unexpected error ({0}) during copy".format(str(e))
+            debug.error("{0}, recorded data up to offset {1:0x}, use --resume to continue".format(reason, progress))
         finally:
-            f.close()
+            os.close(fd)
         outfd.write("|\n")
+
+        if os.path.exists(self.progress_filename()):
+            os.remove(self.progress_filename())
+
+        elapsed = max(time.time() - start, 0.001)
+        total = writer.written + writer.skipped
+        outfd.write("Copied {0} in {1:0.1f}s ({2}/s), {3} left sparse\n".format(
+                    self.human_readable(total), elapsed,
+                    self.human_readable(total / elapsed), self.human_readable(writer.skipped)))
@@ -41,15 +41,19 @@ class ImageInfo(kdbgscan.KDBGScan):
         print "Determining profile based on KDBG search...\n"
         profilelist = [ p.__name__ for p in registry.get_plugin_classes(obj.Profile).values() ]
 
+        ## A single KDBG scan over the image ranks the windows profiles
+        ## without compiling any of them
+        signatures = kdbgscan.profile_signatures(self._config)
+        aspace = utils.load_as(self._config, astype = 'any')
+        suglist = kdbgscan.rank_profiles(kdbgscan.find_kdbg(aspace, signatures))
+
         bestguess = None
-        suglist = [ s for s, _ in kdbgscan.KDBGScan.calculate(self)]
         if suglist:
             bestguess = suglist[0]
-        suggestion = ", ".join(set(suglist))
+        suggestion = ", ".join(suglist)
 
-        # Set our suggested profile first, then run through the list
-        if bestguess in profilelist:
-            profilelist = [bestguess] + profilelist
+        # Set our suggested profiles first, then run through the list
+        profilelist = suglist + [p for p in profilelist if p not in suglist]
         chosen = 'no profile'
 
         # Save the original profile
@@ -19,11 +19,13 @@
 # along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import os
+import sys
+import cPickle as pickle
 import volatility.obj as obj
 import volatility.scan as scan
 import volatility.cache as cache
 import volatility.plugins.common as common
-import volatility.addrspace as addrspace
 import volatility.registry as registry
 import volatility.utils as utils
 import volatility.exceptions as exceptions
@@ -91,6 +93,116 @@ class KDBGScanner(scan.BaseScanner):
             offset = offset - 0x10
             yield offset
 
+def profile_metadata(cls):
+    """Returns the metadata of a profile class without instantiating it"""
+    prefix = '_md_'
+    return dict((i[len(prefix):], getattr(cls, i)) for i in dir(cls) if i.startswith(prefix))
+
+def source_stamp(classes):
+    """Returns the name, mtime and size of the modules defining classes"""
+    stamp = set()
+    for cls in classes:
+        filename = getattr(sys.modules.get(cls.__module__), '__file__', None)
+        if not filename:
+            continue
+        filename = os.path.splitext(filename)[0] + ".py"
+        try:
+            st = os.stat(filename)
+            stamp.add((filename, st.st_mtime, st.st_size))
+        except OSError:
+            stamp.add((filename, None, None))
+    return sorted(stamp)
+
+## Signatures worked out earlier in this run
+_signatures = None
+
+def profile_signatures(config):
+    """ Returns the detection signatures of the windows profiles.
+
+    The result maps each profile name to a dict holding its metadata
+    and the constant VOLATILITY_MAGIC values (KDBGHeader, DTBSignature,
+    KUSER_SHARED_DATA, ...). Working these out means compiling every
+    profile, so the table is kept in the cache directory and only
+    rebuilt when the modules defining the profiles or their
+    modifications change. Profiles for other operating systems are
+    recognised from their class metadata and never instantiated.
+    """
+    global _signatures
+
+    profiles = {}
+    for name, cls in registry.get_plugin_classes(obj.Profile).items():
+        if profile_metadata(cls).get('os', 'unknown') == 'windows':
+            profiles[name] = cls
+
+    stamp = source_stamp(profiles.values() +
+                         registry.get_plugin_classes(obj.ProfileModification, showall = True).values())
+
+    if _signatures and _signatures[0] == stamp:
+        return _signatures[1]
+
+    filename = os.path.join(config.CACHE_DIRECTORY, "profiles.signatures")
+    try:
+        stored_stamp, table = pickle.load(open(filename, "rb"))
+        if stored_stamp != stamp or set(table) != set(profiles):
+            table = None
+    except Exception:
+        table = None
+
+    if table is None:
+        table = {}
+        for name, cls in profiles.items():
+            magic = {}
+            for member, (_, target) in cls().vtypes['VOLATILITY_MAGIC'][1].items():
+                if len(target) > 1 and target[0] == 'VolatilityMagic' and not target[1].get('configname'):
+                    magic[member] = target[1].get('value')
+            table[name] = dict(metadata = profile_metadata(cls), magic = magic)
+
+        try:
+            if not os.path.isdir(config.CACHE_DIRECTORY):
+                os.makedirs(config.CACHE_DIRECTORY)
+            temp = "{0}.{1}".format(filename, os.getpid())
+            fd = open(temp, "wb")
+            pickle.dump((stamp, table), fd, 2)
+            fd.close()
+            os.rename(temp, filename)
+        except EnvironmentError:
+            pass
+
+    _signatures = (stamp, table)
+    return table
+
+def find_kdbg(aspace, signatures):
+    """ Scans aspace once for the KDBG headers of all the profiles.
+
+    Yields the name of each profile whose header matches a hit along
+    with the offset of the hit.
+    """
+    headers = {}
+    for name, signature in signatures.items():
+        header = signature['magic'].get('KDBGHeader')
+        if header:
+            headers.setdefault(header, []).append(name)
+
+    if not headers:
+        return
+
+    maxlen = max([len(header) for header in headers])
+    scanner = KDBGScanner(needles = headers.keys())
+
+    for offset in scanner.scan(aspace):
+        val = aspace.read(offset, maxlen + 0x10)
+        for header, names in headers.items():
+            if val.find(header) >= 0:
+                for name in sorted(names):
+                    yield name, offset
+
+def rank_profiles(hits):
+    """Orders the profile names from find_kdbg by their number of hits"""
+    counts = {}
+    for name, _offset in hits:
+        counts[name] = counts.get(name, 0) + 1
+    return sorted(counts, key = lambda name: (-counts[name], name))
+
 class KDBGScan(common.AbstractWindowsCommand):
     """Search for and dump potential KDBG values"""
 
@@ -102,29 +214,13 @@ class KDBGScan(common.AbstractWindowsCommand):
     @cache.CacheDecorator(lambda self: "tests/kdbgscan/kdbg={0}".format(self._config.KDBG))
     def calculate(self):
         """Determines the address space"""
-        profilelist = [ p.__name__ for p in registry.get_plugin_classes(obj.Profile).values() ]
-
-        proflens = {}
-        maxlen = 0
-        origprofile = self._config.PROFILE
-        for p in profilelist:
-            self._config.update('PROFILE', p)
-            buf = addrspace.BufferAddressSpace(self._config)
-            if buf.profile.metadata.get('os', 'unknown') == 'windows':
-                proflens[p] = str(obj.VolMagic(buf).KDBGHeader)
-                maxlen = max(maxlen, len(proflens[p]))
-        self._config.update('PROFILE', origprofile)
-
-        scanner = KDBGScanner(needles = proflens.values())
+        signatures = profile_signatures(self._config)
 
         aspace = utils.load_as(self._config, astype = 'any')
 
-        for offset in scanner.scan(aspace):
-            val = aspace.read(offset, maxlen + 0x10)
-            for l in proflens:
-                if val.find(proflens[l]) >= 0:
-                    kdbg = obj.Object("_KDDEBUGGER_DATA64", offset = offset, vm = aspace)
-                    yield l, kdbg
+        for name, offset in find_kdbg(aspace, signatures):
+            kdbg = obj.Object("_KDDEBUGGER_DATA64", offset = offset, vm = aspace)
+            yield name, kdbg
 
     def render_text(self, outfd, data):
         """Renders the KPCR values as text"""
@@ -143,7 +143,7 @@ class linux_check_syscall(linux_common.AbstractLinuxCommand):
 
             table = obj.Object(theType = 'Array', offset = tableaddr, vm = self.addr_space, targetType = 'unsigned long', count = tblsz)
 
-            for (i, call_addr) in enumerate(table):
+            for (i, call_addr) in enumerate(table.values()):
 
                 if not call_addr:
                     continue
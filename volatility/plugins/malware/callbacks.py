@@ -235,6 +235,7 @@ class Callbacks(common.AbstractWindowsCommand):
         common.AbstractWindowsCommand.__init__(self, *args, **kwargs)
         self.phys_space = None
         self.kern_space = None
+        self.pool_hits = {}
 
     @staticmethod
     def get_kernel_callbacks(nt_mod):
@@ -288,14 +289,14 @@ class Callbacks(common.AbstractWindowsCommand):
     def get_fs_callbacks(self):
         """Enumerate the File System change callbacks"""
 
-        for offset in PoolScanFSCallback().scan(self.phys_space):
+        for offset in self.pool_hits.get(PoolScanFSCallback, []):
             callback = obj.Object('_NOTIFICATION_PACKET', offset, self.phys_space)
             yield "IoRegisterFsRegistrationChange", callback.NotificationRoutine, None
 
     def get_shutdown_callbacks(self):
         """Enumerate shutdown notification callbacks"""
 
-        for offset in PoolScanShutdownCallback().scan(self.phys_space):
+        for offset in self.pool_hits.get(PoolScanShutdownCallback, []):
 
             # Instantiate the object in physical space but give it a native
             # VM of kernel space 
@@ -398,14 +399,14 @@ class Callbacks(common.AbstractWindowsCommand):
         finding the generic callback structure 
         """
 
-        for offset in PoolScanGenericCallback().scan(self.phys_space):
+        for offset in self.pool_hits.get(PoolScanGenericCallback, []):
             callback = obj.Object('_GENERIC_CALLBACK', offset, self.phys_space)
             yield "GenericKernelCallback", callback.Callback, None
 
     def get_dbgprint_callbacks(self):
         """Enumerate DebugPrint callbacks on Vista and 7"""
 
-        for offset in PoolScanDbgPrintCallback().scan(self.phys_space):
+        for offset in self.pool_hits.get(PoolScanDbgPrintCallback, []):
             callback = obj.Object('_DBGPRINT_CALLBACK', offset, self.phys_space)
             yield "DbgSetDebugPrintCallback", callback.Function, None
 
@@ -417,7 +418,7 @@ class Callbacks(common.AbstractWindowsCommand):
         or CmRegisterCallbackEx.
         """
 
-        for offset in PoolScanRegistryCallback().scan(self.phys_space):
+        for offset in self.pool_hits.get(PoolScanRegistryCallback, []):
             callback = obj.Object('_REGISTRY_CALLBACK', offset, self.phys_space)
             yield "CmRegisterCallback", callback.Function, None
 
@@ -426,14 +427,8 @@ class Callbacks(common.AbstractWindowsCommand):
 
         offsets = []
 
-        for offset in PoolScanPnp9().scan(self.phys_space):
-            offsets.append(offset)
-
-        for offset in PoolScanPnpD().scan(self.phys_space):
-            offsets.append(offset)
-
-        for offset in PoolScanPnpC().scan(self.phys_space):
-            offsets.append(offset)
+        for scanner in [PoolScanPnp9, PoolScanPnpD, PoolScanPnpC]:
+            offsets.extend(self.pool_hits.get(scanner, []))
 
         for offset in offsets:
             entry = obj.Object("_NOTIFY_ENTRY_HEADER", offset = offset,
@@ -493,6 +488,25 @@ class Callbacks(common.AbstractWindowsCommand):
         for l in bugs.Entry.list_of_type("_KBUGCHECK_REASON_CALLBACK_RECORD", "Entry"):
             yield symbol, l.CallbackRoutine, l.Component.dereference()
 
+    def scan_pools(self, version):
+        """
+        Run all the callback pool scanners over physical memory in 
+        a single pass and store the hits for each scanner class. 
+        """
+
+        scanners = [PoolScanFSCallback(), PoolScanShutdownCallback(),
+                    PoolScanGenericCallback()]
+
+        # Valid for Vista and later
+        if version >= (6, 0):
+            scanners += [PoolScanDbgPrintCallback(), PoolScanRegistryCallback(),
+                         PoolScanPnp9(), PoolScanPnpD(), PoolScanPnpC()]
+
+        self.pool_hits = dict((s.__class__, []) for s in scanners)
+
+        for scanner, offset in scan.MultiPoolScanner(scanners).scan(self.phys_space):
+            self.pool_hits[scanner.__class__].append(offset)
+
     def calculate(self):
         # All scanners will share a kernel and physical space 
         self.kern_space = utils.load_as(self._config)
@@ -510,6 +524,8 @@ class Callbacks(common.AbstractWindowsCommand):
         mods = dict((self.kern_space.address_mask(mod.DllBase), mod) for mod in modlist)
         mod_addrs = sorted(mods.keys())
 
+        self.scan_pools(version)
+
         # First few routines are valid on all OS versions 
         for info in self.get_fs_callbacks():
             yield info, mods, mod_addrs
@@ -19,6 +19,7 @@
 #
 
 import volatility.utils as utils
+import volatility.scan as scan
 import volatility.obj as obj
 import volatility.plugins.common as common
 import volatility.win32.tasks as tasks
@@ -80,16 +81,19 @@ class PsXview(common.AbstractWindowsCommand, sessions.SessionsMixin):
         """Enumerate processes from PsActiveProcessHead"""
         return dict((p.obj_vm.vtop(p.obj_offset), p) for p in all_tasks)
 
-    def check_psscan(self):
+    def check_psscan(self, phys_space, addr_space, offsets):
         """Enumerate processes with pool tag scanning"""
-        return dict((p.obj_offset, p)
-                    for p in filescan.PSScan(self._config).calculate())
+        return dict((offset, obj.Object('_EPROCESS', vm = phys_space,
+                                        native_vm = addr_space, offset = offset))
+                    for offset in offsets)
 
-    def check_thrdproc(self, _addr_space):
+    def check_thrdproc(self, phys_space, addr_space, offsets):
         """Enumerate processes indirectly by ETHREAD scanning"""
         ret = dict()
 
-        for ethread in modscan.ThrdScan(self._config).calculate():
+        for offset in offsets:
+            ethread = obj.Object('_ETHREAD', vm = phys_space,
+                                 native_vm = addr_space, offset = offset)
             if ethread.ExitTime != 0:
                 continue
             # Bounce back to the threads owner 
@@ -165,13 +169,20 @@ class PsXview(common.AbstractWindowsCommand, sessions.SessionsMixin):
 
         all_tasks = list(tasks.pslist(addr_space))
 
+        # The process and thread scanners share a single pass
+        # over physical memory 
+        phys_space = utils.load_as(self._config, astype = 'physical')
+        session = scan.ScanSession(phys_space)
+        proc_offsets = session.register(filescan.PoolScanProcess())
+        thread_offsets = session.register(modscan.PoolScanThreadFast())
+
         ps_sources = {}
         # The keys are names of process sources. The values
         # are dictionaries whose keys are physical process 
         # offsets and the values are _EPROCESS objects. 
         ps_sources['pslist'] = self.check_pslist(all_tasks)
-        ps_sources['psscan'] = self.check_psscan()
-        ps_sources['thrdproc'] = self.check_thrdproc(addr_space)
+        ps_sources['psscan'] = self.check_psscan(phys_space, addr_space, proc_offsets)
+        ps_sources['thrdproc'] = self.check_thrdproc(phys_space, addr_space, thread_offsets)
         ps_sources['csrss'] = self.check_csrss_handles(all_tasks)
         ps_sources['pspcid'] = self.check_pspcid(addr_space)
         ps_sources['session'] = self.check_sessions(addr_space)
@@ -32,6 +32,7 @@ import volatility.scan as scan
 import volatility.utils as utils
 import volatility.addrspace as addrspace
 import volatility.obj as obj
+import volatility.spill as spill
 import struct
 import binascii
 
@@ -111,7 +112,8 @@ INDEX_ENTRY_FLAGS = {
     0x2:"Last entry in list",
 }
 
-MFT_PATHS_FULL = {}
+## Record number -> (parent record reference, filename)
+MFT_PATHS_FULL = spill.SpillDict(entry_size = 256)
 
 class MFT_FILE_RECORD(obj.CType):
     def remove_unprintable(self, str):
@@ -119,11 +121,10 @@ class MFT_FILE_RECORD(obj.CType):
 
     def add_path(self, fileinfo):
         cur = MFT_PATHS_FULL.get(int(self.RecordNumber), None)
-        if cur == None or cur["filename"].find("~") != -1 and fileinfo.is_valid():
-            temp = {}
-            temp["ParentDirectory"] = fileinfo.ParentDirectory
-            temp["filename"] = self.remove_unprintable(fileinfo.get_name())
-            MFT_PATHS_FULL[int(self.RecordNumber)] = temp
+        if cur == None or cur[1].find("~") != -1 and fileinfo.is_valid():
+            # Only plain values are kept, so the entry's buffer can be freed
+            MFT_PATHS_FULL[int(self.RecordNumber)] = (int(fileinfo.ParentDirectory),
+                                                      self.remove_unprintable(fileinfo.get_name()))
 
     def get_full_path(self, fileinfo):
         parent = ""
@@ -131,12 +132,12 @@ class MFT_FILE_RECORD(obj.CType):
         path = self.remove_unprintable(fileinfo.get_name()) or "(Null)"
         if int(self.RecordNumber) == 5 or int(self.RecordNumber) == 0:
             return path
-        while parent != {}:
-            parent = MFT_PATHS_FULL.get(int(parent_id), {})
-            if parent == {} or parent["filename"] == "" or int(parent_id) == 0 or int(parent_id) == 5:
+        while parent != None:
+            parent = MFT_PATHS_FULL.get(int(parent_id), None)
+            if parent == None or parent[1] == "" or int(parent_id) == 0 or int(parent_id) == 5:
                 return path
-            path = parent["filename"] + "\\" + path
-            parent_id = parent["ParentDirectory"] & 0xffffff
+            path = parent[1] + "\\" + path
+            parent_id = parent[0] & 0xffffff
         return path
 
     def get_mft_type(self):
@@ -149,7 +150,9 @@ class MFT_FILE_RECORD(obj.CType):
         
 
 class RESIDENT_ATTRIBUTE(obj.CType):
-    def process_attr_list(self, bufferas, mft_entry, attributes = [], check = False):
+    def process_attr_list(self, bufferas, mft_entry, attributes = [], check = False, paths = True):
+        """Decodes the list's entries into attributes.  With attributes
+        None only the FILE_NAME entries are read, to add their paths"""
         start = 0
         end = self.obj_offset + self.ContentSize
         while start < end:
@@ -161,13 +164,17 @@ class RESIDENT_ATTRIBUTE(obj.CType):
                 thetype = ATTRIBUTE_TYPE_ID.get(int(item.Type), None)
                 if thetype == None:
                     return
+                elif attributes is None and thetype != "FILE_NAME":
+                    pass
                 elif item.Length > 0x20 and thetype in ["STANDARD_INFORMATION", "FILE_NAME"]:
                     theitem = obj.Object(thetype, vm = bufferas, offset = item.AttributeID.obj_offset)
                     if thetype == "STANDARD_INFORMATION" and (not check or theitem.is_valid()):
                         attributes.append(("STANDARD_INFORMATION (AL)", theitem))
                     elif thetype == "FILE_NAME" and (not check or theitem.is_valid()):
-                        mft_entry.add_path(theitem)
-                        attributes.append(("FILE_NAME (AL)", theitem))
+                        if paths:
+                            mft_entry.add_path(theitem)
+                        if attributes is not None:
+                            attributes.append(("FILE_NAME (AL)", theitem))
             except struct.error:
                 return
             if item.Length == 0:
@@ -226,13 +233,13 @@ class STANDARD_INFORMATION(obj.CType):
         if path == "":
             # if the path is null we just try to get the filename 
             # from our dictionary and print the body file output
-            record = MFT_PATHS_FULL.get(int(record_num), {}) 
-            if record != {}:
+            record = MFT_PATHS_FULL.get(int(record_num), None)
+            if record != None:
                 # we include with the found filename a note that this may be a 
                 # non-base entry.  the analyst can investigate these types of records
                 # on his/her own by comparing record numbers in output or examining the 
                 # given physical offset in memory for example
-                path = record["filename"] + " (Possible non-base entry, extra $SI or invalid $FN)"
+                path = record[1] + " (Possible non-base entry, extra $SI or invalid $FN)"
 
         return "[MFT STD_INFO] {0} (Offset: 0x{1:x})|{2}|{3}|0|0|{4}|{5}|{6}|{7}|{8}".format(
             path,
@@ -528,88 +535,152 @@ class MFTParser(common.AbstractWindowsCommand):
     def calculate(self):
         address_space = utils.load_as(self._config, astype = 'physical')
         scanner = MFTScanner(needles = ['FILE', 'BAAD'])
-        mft_entries = []
         print "Scanning for MFT entries and building directory, this can take a while"
+        ## Full paths need the whole directory, so the first pass only
+        ## reads the names while building it and records where the
+        ## entries are.  Entries are fully parsed and yielded one at a
+        ## time in the second.
+        offsets = []
         for offset in scanner.scan(address_space):
-            mft_buff = address_space.read(offset, self._config.ENTRYSIZE)
-            bufferas = addrspace.BufferAddressSpace(self._config, data = mft_buff)
-            mft_entry = obj.Object('MFT_FILE_RECORD', vm = bufferas,
-                               offset = 0)
-            next_attr = mft_entry.ResidentAttributes
-            end = mft_buff.find("\xff\xff\xff\xff")
-            if end == -1:
-                end = self._config.ENTRYSIZE
-            attributes = []
-            while next_attr != None and next_attr.obj_offset <= end:
-                try:
-                    attr = ATTRIBUTE_TYPE_ID.get(int(next_attr.Header.Type), None)
-                except struct.error:
+            self.index_paths(address_space, offset)
+            offsets.append(offset)
+
+        for offset in offsets:
+            mft_entry, attributes = self.parse_entry(address_space, offset, paths = False)
+            yield offset, mft_entry, attributes
+
+    def index_paths(self, address_space, offset):
+        """Adds the names of the MFT entry at offset to the directory.
+
+        This walks the attributes the way parse_entry does, but only
+        decodes the FILE_NAME ones."""
+        mft_buff = address_space.read(offset, self._config.ENTRYSIZE)
+        bufferas = addrspace.BufferAddressSpace(self._config, data = mft_buff)
+        mft_entry = obj.Object('MFT_FILE_RECORD', vm = bufferas,
+                           offset = 0)
+        next_attr = mft_entry.ResidentAttributes
+        end = mft_buff.find("\xff\xff\xff\xff")
+        if end == -1:
+            end = self._config.ENTRYSIZE
+        while next_attr != None and next_attr.obj_offset <= end:
+            try:
+                attr = ATTRIBUTE_TYPE_ID.get(int(next_attr.Header.Type), None)
+            except struct.error:
+                return
+            if attr == "STANDARD_INFORMATION":
+                content = next_attr.STDInfo
+            elif attr == "FILE_NAME":
+                content = next_attr.FileName
+                mft_entry.add_path(content)
+            elif attr == "OBJECT_ID":
+                if next_attr.Header.NonResidentFlag == 1:
+                    return
+                content = next_attr.ObjectID
+            elif attr == "DATA":
+                start = next_attr.obj_offset + next_attr.ContentOffset
+                theend = min(start + next_attr.ContentSize, end)
+                if next_attr.Header.NonResidentFlag != 1:
+                    try:
+                        mft_buff[start:theend]
+                    except TypeError:
+                        return
+                if theend == start:
+                    return
+                next_attr = self.advance_one(theend, mft_buff, end)
+                continue
+            elif attr == "ATTRIBUTE_LIST":
+                if next_attr.Header.NonResidentFlag != 1:
+                    next_attr.process_attr_list(bufferas, mft_entry, None, self._config.CHECK)
+                return
+            else:
+                return
+            next_off = content.obj_offset + next_attr.ContentSize
+            if next_off == content.obj_offset:
+                return
+            next_attr = self.advance_one(next_off, mft_buff, end)
+
+    def parse_entry(self, address_space, offset, paths = True):
+        """Parses the MFT entry at offset, adding its names to the
+        directory if paths is set"""
+        mft_buff = address_space.read(offset, self._config.ENTRYSIZE)
+        bufferas = addrspace.BufferAddressSpace(self._config, data = mft_buff)
+        mft_entry = obj.Object('MFT_FILE_RECORD', vm = bufferas,
+                           offset = 0)
+        next_attr = mft_entry.ResidentAttributes
+        end = mft_buff.find("\xff\xff\xff\xff")
+        if end == -1:
+            end = self._config.ENTRYSIZE
+        attributes = []
+        while next_attr != None and next_attr.obj_offset <= end:
+            try:
+                attr = ATTRIBUTE_TYPE_ID.get(int(next_attr.Header.Type), None)
+            except struct.error:
+                next_attr = None
+                attr = None
+                continue
+            if attr == None:
+                next_attr = None
+            elif attr == "STANDARD_INFORMATION":
+                if next_attr.STDInfo.is_valid() or not self._config.CHECK:
+                    attributes.append((attr, next_attr.STDInfo))
+                next_off = next_attr.STDInfo.obj_offset + next_attr.ContentSize
+                if next_off == next_attr.STDInfo.obj_offset:
                     next_attr = None
-                    attr = None
                     continue
-                if attr == None:
-                    next_attr = None
-                elif attr == "STANDARD_INFORMATION":
-                    if next_attr.STDInfo.is_valid() or not self._config.CHECK:
-                        attributes.append((attr, next_attr.STDInfo))
-                    next_off = next_attr.STDInfo.obj_offset + next_attr.ContentSize
-                    if next_off == next_attr.STDInfo.obj_offset:
-                        next_attr = None
-                        continue
-                    next_attr = self.advance_one(next_off, mft_buff, end)
-                elif attr == 'FILE_NAME':
+                next_attr = self.advance_one(next_off, mft_buff, end)
+            elif attr == 'FILE_NAME':
+                if paths:
                     mft_entry.add_path(next_attr.FileName)
-                    if next_attr.FileName.is_valid() or not self._config.CHECK:
-                        attributes.append((attr, next_attr.FileName))
-                    next_off = next_attr.FileName.obj_offset + next_attr.ContentSize
-                    if next_off == next_attr.FileName.obj_offset:
-                        next_attr = None
-                        continue
-                    next_attr = self.advance_one(next_off, mft_buff, end)
-                elif attr == "OBJECT_ID":
-                    if next_attr.Header.NonResidentFlag == 1:
-                        attributes.append((attr, "Non-Resident"))
-                        next_attr = None
-                        continue
-                    else:
-                        attributes.append((attr, next_attr.ObjectID))
-                    next_off = next_attr.ObjectID.obj_offset + next_attr.ContentSize
-                    if next_off == next_attr.ObjectID.obj_offset:
-                        next_attr = None
-                        continue
-                    next_attr = self.advance_one(next_off, mft_buff, end)
-                elif attr == "DATA":
-                    start = next_attr.obj_offset + next_attr.ContentOffset
-                    theend = min(start + next_attr.ContentSize, end)
-                    if next_attr.Header.NonResidentFlag == 1:
-                        thedata = "Non-Resident"
-                    else:
-                        try:
-                            contents = mft_buff[start:theend]
-                        except TypeError:
-                            next_attr = None
-                            continue
-                        thedata = "\n".join(["{0:010x}: {1:<48}  {2}".format(o, h, ''.join(c)) for o, h, c in utils.Hexdump(contents)])
-                        if len(thedata) == 0:
-                            thedata = "(Empty)"
-                    attributes.append((attr, thedata))
-                    next_off = theend 
-                    if next_off == start: 
-                        next_attr = None
-                        continue
-                    next_attr = self.advance_one(next_off, mft_buff, end)
-                elif attr == "ATTRIBUTE_LIST":
-                    if next_attr.Header.NonResidentFlag == 1:
-                        attributes.append((attr, "Non-Resident"))
+                if next_attr.FileName.is_valid() or not self._config.CHECK:
+                    attributes.append((attr, next_attr.FileName))
+                next_off = next_attr.FileName.obj_offset + next_attr.ContentSize
+                if next_off == next_attr.FileName.obj_offset:
+                    next_attr = None
+                    continue
+                next_attr = self.advance_one(next_off, mft_buff, end)
+            elif attr == "OBJECT_ID":
+                if next_attr.Header.NonResidentFlag == 1:
+                    attributes.append((attr, "Non-Resident"))
+                    next_attr = None
+                    continue
+                else:
+                    attributes.append((attr, next_attr.ObjectID))
+                next_off = next_attr.ObjectID.obj_offset + next_attr.ContentSize
+                if next_off == next_attr.ObjectID.obj_offset:
+                    next_attr = None
+                    continue
+                next_attr = self.advance_one(next_off, mft_buff, end)
+            elif attr == "DATA":
+                start = next_attr.obj_offset + next_attr.ContentOffset
+                theend = min(start + next_attr.ContentSize, end)
+                if next_attr.Header.NonResidentFlag == 1:
+                    thedata = "Non-Resident"
+                else:
+                    try:
+                        contents = mft_buff[start:theend]
+                    except TypeError:
                         next_attr = None
                         continue
-                    next_attr.process_attr_list(bufferas, mft_entry, attributes, self._config.CHECK)
+                    thedata = "\n".join(["{0:010x}: {1:<48}  {2}".format(o, h, ''.join(c)) for o, h, c in utils.Hexdump(contents)])
+                    if len(thedata) == 0:
+                        thedata = "(Empty)"
+                attributes.append((attr, thedata))
+                next_off = theend 
+                if next_off == start: 
                     next_attr = None
-                else:
+                    continue
+                next_attr = self.advance_one(next_off, mft_buff, end)
+            elif attr == "ATTRIBUTE_LIST":
+                if next_attr.Header.NonResidentFlag == 1:
+                    attributes.append((attr, "Non-Resident"))
                     next_attr = None
-            mft_entries.append((offset, mft_entry, attributes))
+                    continue
+                next_attr.process_attr_list(bufferas, mft_entry, attributes, self._config.CHECK, paths)
+                next_attr = None
+            else:
+                next_attr = None
 
-        return mft_entries
+        return mft_entry, attributes
 
 
     def advance_one(self, next_off, mft_buff, end):
@@ -186,8 +186,18 @@ class Netscan(common.AbstractWindowsCommand):
         if not self.is_valid_profile(kernel_space.profile):
             debug.error("This command does not support the selected profile.")
 
+        for sock in self.parse_sockets(kernel_space, flat_space,
+                                       PoolScanTcpListener().scan(flat_space),
+                                       PoolScanTcpEndpoint().scan(flat_space),
+                                       PoolScanUdpEndpoint().scan(flat_space)):
+            yield sock
+
+    def parse_sockets(self, kernel_space, flat_space, listeners, endpoints, udp_endpoints):
+        """Yields the sockets at the offsets found by the TCP listener,
+        TCP endpoint and UDP endpoint scanners, in that order"""
+
         # Scan for TCP listeners also known as sockets
-        for offset in PoolScanTcpListener().scan(flat_space):
+        for offset in listeners:
 
             tcpentry = obj.Object('_TCP_LISTENER', offset = offset,
                                   vm = flat_space, native_vm = kernel_space)
@@ -201,7 +211,7 @@ class Netscan(common.AbstractWindowsCommand):
                 yield tcpentry, "TCP" + ver, laddr, tcpentry.Port, raddr, 0, "LISTENING"
 
         # Scan for TCP endpoints also known as connections 
-        for offset in PoolScanTcpEndpoint().scan(flat_space):
+        for offset in endpoints:
 
             tcpentry = obj.Object('_TCP_ENDPOINT', offset = offset,
                                   vm = flat_space, native_vm = kernel_space)
@@ -224,7 +234,7 @@ class Netscan(common.AbstractWindowsCommand):
                     tcpentry.RemoteAddress, tcpentry.RemotePort, tcpentry.State
 
         # Scan for UDP endpoints 
-        for offset in PoolScanUdpEndpoint().scan(flat_space):
+        for offset in udp_endpoints:
 
             udpentry = obj.Object('_UDP_ENDPOINT', offset = offset,
                                   vm = flat_space, native_vm = kernel_space)
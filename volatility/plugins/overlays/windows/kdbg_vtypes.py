@@ -42,7 +42,7 @@ class _KDDEBUGGER_DATA64(obj.CType):
             raise AttributeError("Could not list tasks, please verify your --profile with kdbgscan")
 
         for l in list_head.list_of_type("_EPROCESS", "ActiveProcessLinks"):
-            yield l
+            yield l.snapshot()
 
     def modules(self):
         """Enumerate modules"""
@@ -73,6 +73,8 @@ class WinSyscallsAttribute(obj.ProfileModification):
 class AbstractSyscalls(obj.ProfileModification):
     syscall_module = 'No default'
     def modification(self, profile):
+        if self.syscall_module not in sys.modules:
+            __import__(self.syscall_module)
         module = sys.modules.get(self.syscall_module, None)
         profile.additional['syscalls'] = module.syscalls
 
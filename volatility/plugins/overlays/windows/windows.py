@@ -455,6 +455,7 @@ class _HANDLE_TABLE(obj.CType):
                            targetType = targetType, parent = self, native_vm = self.obj_native_vm)
 
         if table:
+            table.snapshot()
             for entry in table:
                 if not entry.is_valid():
                     break
@@ -29,7 +29,6 @@ class Raw2dmp(imagecopy.ImageCopy):
 
     def calculate(self):
 
-        blocksize = self._config.BLOCKSIZE
         self._config.WRITE = True
         pspace = utils.load_as(self._config, astype = 'physical')
         vspace = utils.load_as(self._config)
@@ -128,9 +127,8 @@ class Raw2dmp(imagecopy.ImageCopy):
         yield 0, headerspace.read(0, headerlen)
     
         # Write the main body
-        for s, l in pspace.get_available_addresses():
-            for i in range(s, s + l, blocksize):
-                yield i + headerlen, pspace.read(i, min(blocksize, s + l - i))
+        for block in self.read_blocks(pspace, headerlen, 'read'):
+            yield block
 
         # Reset the config so volatility opens the crash dump 
         self._config.LOCATION = "file://" + self._config.OUTPUT_IMAGE
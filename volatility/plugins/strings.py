@@ -25,6 +25,7 @@ import volatility.obj as obj
 import volatility.utils as utils
 import volatility.win32 as win32
 import volatility.debug as debug
+import volatility.spill as spill
 
 class Strings(taskmods.DllList):
     """Match physical offsets to virtual addresses (may take a while, VERY verbose)"""
@@ -89,9 +90,10 @@ class Strings(taskmods.DllList):
                 offset = int(offsetString)
             except ValueError:
                 debug.error("String file format invalid.")
-            if reverse_map.has_key(offset & 0xFFFFF000):
+            pagelist = reverse_map.get(offset & 0xFFFFF000, None)
+            if pagelist is not None:
                 outfd.write("{0:08x} [".format(offset))
-                outfd.write(' '.join(["{0}:{1:08x}".format(pid[0], pid[1] | (offset & 0xFFF)) for pid in reverse_map[offset & 0xFFFFF000][1:]]))
+                outfd.write(' '.join(["{0}:{1:08x}".format(pid[0], pid[1] | (offset & 0xFFF)) for pid in pagelist[1:]]))
                 outfd.write("] {0}\n".format(string.strip()))
 
     @staticmethod
@@ -99,7 +101,7 @@ class Strings(taskmods.DllList):
         """Generates a reverse mapping from physical addresses to the kernel and/or tasks
         
            Returns:
-           dict of form phys_page -> [isKernel, (pid1, vaddr1), (pid2, vaddr2) ...]
+           spill.SpillDict of form phys_page -> [isKernel, (pid1, vaddr1), (pid2, vaddr2) ...]
            where isKernel is True or False. if isKernel is true, list is of all kernel addresses
         """
 
@@ -115,7 +117,8 @@ class Strings(taskmods.DllList):
         #      really stored in one or more 4k pages.  This is no different from the old
         #      version of the code, but in this version it could be corrected easily by
         #      recording vpage instead of vpage+i in the reverse map. -- TDM
-        reverse_map = {}
+        ## Kept in a SpillDict so that --max-memory bounds it on large images
+        reverse_map = spill.SpillDict(entry_size = 192)
 
         verbfd.write("Enumerating kernel modules...\n")
         mods = dict((addr_space.address_mask(mod.DllBase), mod) for mod in win32.modules.lsmod(addr_space))
@@ -126,11 +129,10 @@ class Strings(taskmods.DllList):
         for (vpage, vpage_size) in available_pages:
             kpage = addr_space.vtop(vpage)
             for i in range(0, vpage_size, 0x1000):
-                # Since the output will always be mutable, we don't need to reinsert into the list
+                # Values may come back from disk as copies, so always reinsert the list
                 pagelist = reverse_map.get(kpage + i, None)
                 if pagelist is None:
                     pagelist = [True]
-                    reverse_map[kpage + i] = pagelist
                 # Try to lookup the owning kernel module
                 module = win32.tasks.find_module(mods, mod_addrs, addr_space.address_mask(vpage + i))
                 if module:
@@ -138,6 +140,7 @@ class Strings(taskmods.DllList):
                 else:
                     hint = 'kernel'
                 pagelist.append((hint, vpage + i))
+                reverse_map[kpage + i] = pagelist
                 verbfd.write("\r  Kernel [{0:08x}]".format(vpage))
         verbfd.write("\n")
 
@@ -151,13 +154,13 @@ class Strings(taskmods.DllList):
                 for (vpage, vpage_size) in available_pages:
                     physpage = task_space.vtop(vpage)
                     for i in range(0, vpage_size, 0x1000):
-                        # Since the output will always be mutable, we don't need to reinsert into the list
+                        # Values may come back from disk as copies, so always reinsert the list
                         pagelist = reverse_map.get(physpage + i, None)
                         if pagelist is None:
                             pagelist = [False]
-                            reverse_map[physpage + i] = pagelist
                         if not pagelist[0]:
                             pagelist.append((process_id, vpage + i))
+                            reverse_map[physpage + i] = pagelist
 
                     verbfd.write("\r  Task {0} [{1:08x}]".format(process_id, vpage))
             except (AttributeError, ValueError, TypeError):
@@ -43,6 +43,7 @@ import volatility.win32.rawreg as rawreg
 import volatility.addrspace as addrspace
 import volatility.win32.tasks as tasks
 import volatility.utils as utils
+import volatility.scan as scan
 import volatility.protos as protos
 import os, sys
 import struct
@@ -117,6 +118,7 @@ class TimeLiner(dlldump.DLLDump, procdump.ProcExeDump, userassist.UserAssist):
 
         pids = {}     #dictionary of process IDs/ImageFileName
         offsets = []  #process offsets
+        seen = set()  #offsets already in the list
         
         im = imageinfo.ImageInfo(self._config).get_image_time(addr_space) 
         body = False
@@ -129,10 +131,22 @@ class TimeLiner(dlldump.DLLDump, procdump.ProcExeDump, userassist.UserAssist):
             event = "0|[END LIVE RESPONSE]|0|---------------|0|0|0|{0}|{0}|{0}|{0}\n".format(im['ImageDatetime'].v())
         yield event
                 
+        # The process, thread and (on Vista+) network scanners share a
+        # single pass over physical memory
+        phys_space = utils.load_as(self._config, astype = 'physical')
+        session = scan.ScanSession(phys_space)
+        proc_offsets = session.register(filescan.PoolScanProcess())
+        thread_offsets = session.register(modscan.PoolScanThreadFast())
+        if addr_space.profile.metadata.get('major', 0) != 5:
+            net_offsets = [session.register(scanner()) for scanner in
+                           (netscan.PoolScanTcpListener, netscan.PoolScanTcpEndpoint, netscan.PoolScanUdpEndpoint)]
+
         # Get EPROCESS 
-        psscan = filescan.PSScan(self._config).calculate()
-        for eprocess in psscan:
-            if eprocess.obj_offset not in offsets:
+        for offset in proc_offsets:
+            eprocess = obj.Object('_EPROCESS', vm = phys_space,
+                                  native_vm = addr_space, offset = offset)
+            if eprocess.obj_offset not in seen:
+                seen.add(eprocess.obj_offset)
                 offsets.append(eprocess.obj_offset)
 
             if not body:
@@ -192,7 +206,10 @@ class TimeLiner(dlldump.DLLDump, procdump.ProcExeDump, userassist.UserAssist):
                     yield line
         else:
             # Vista+
-            nets = netscan.Netscan(self._config).calculate()
+            nets = netscan.Netscan(self._config)
+            if not nets.is_valid_profile(addr_space.profile):
+                debug.error("This command does not support the selected profile.")
+            nets = nets.parse_sockets(addr_space, phys_space, *net_offsets)
             for net_object, proto, laddr, lport, raddr, rport, state in nets:
                 conn = "{0}:{1} -> {2}:{3}".format(laddr, lport, raddr, rport)
                 if not body:
@@ -214,8 +231,9 @@ class TimeLiner(dlldump.DLLDump, procdump.ProcExeDump, userassist.UserAssist):
                 yield line
 
         # Get threads
-        threads = modscan.ThrdScan(self._config).calculate()
-        for thread in threads:
+        for offset in thread_offsets:
+            thread = obj.Object('_ETHREAD', vm = phys_space,
+                                native_vm = addr_space, offset = offset)
             image = pids.get(thread.Cid.UniqueProcess.v(), "UNKNOWN")
             if not body:
                 line = "{0}|[THREAD]|{1}|{2}|{3}|{4}|||\n".format(
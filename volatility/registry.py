@@ -43,10 +43,19 @@ functionality. For example we may include a Scanner, Report and File
 classes in the same plugin and have them all automatically loaded.
 """
 
-import os, zipfile
+import os, re, zipfile
+import cPickle as pickle
 import volatility.debug as debug
 import volatility.plugins as plugins
 
+## The manifest records which plugin modules are pure data (vtypes,
+## syscall tables etc) so they needn't be scanned again on every run
+manifest_location = os.path.join((os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")),
+                                 "volatility", "plugins.manifest")
+
+## Anything that could register a class or an option at import time
+code_regex = re.compile(r"^\s*(class|def)\s|add_option", re.M)
+
 class PluginImporter(object):
     """This class searches through a comma-separated list of plugins and
        imports all classes found, based on their path and a fixed prefix.
@@ -57,6 +66,8 @@ class PluginImporter(object):
            Then imports all modules found
         """
         self.modnames = {}
+        self.manifest = self.load_manifest()
+        self.manifest_changed = False
 
         # Handle additional plugins
         for path in plugins.__path__:
@@ -72,11 +83,63 @@ class PluginImporter(object):
                     initstr = '.__init__'
                     if namespace.endswith(initstr):
                         self.modnames[namespace[:-len(initstr)]] = filepath
+                    elif self.is_data_module(filepath):
+                        # Pure data modules are imported on demand by
+                        # whatever needs them, see obj.Profile.load_vtypes
+                        self.modnames[namespace] = None
                     else:
                         self.modnames[namespace] = filepath
 
+        if self.manifest_changed:
+            self.save_manifest()
+
         self.run_imports()
 
+    def load_manifest(self):
+        try:
+            return pickle.load(open(manifest_location, "rb"))
+        except Exception:
+            return {}
+
+    def save_manifest(self):
+        try:
+            if not os.path.isdir(os.path.dirname(manifest_location)):
+                os.makedirs(os.path.dirname(manifest_location))
+            temp = manifest_location + ".tmp"
+            fd = open(temp, "wb")
+            pickle.dump(self.manifest, fd, 2)
+            fd.close()
+            os.rename(temp, manifest_location)
+        except EnvironmentError:
+            pass
+
+    def is_data_module(self, filepath):
+        """Determines whether a plugin module only defines data
+
+        Data modules have no classes, functions or options, so
+        importing them at startup registers nothing. Only python
+        source on disk is checked, anything else is always imported.
+        """
+        filepath = os.path.splitext(filepath)[0] + ".py"
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return False
+
+        key = (stat.st_mtime, stat.st_size)
+        entry = self.manifest.get(filepath)
+        if entry and entry[0] == key:
+            return entry[1]
+
+        try:
+            result = not code_regex.search(open(filepath).read())
+        except IOError:
+            return False
+
+        self.manifest[filepath] = (key, result)
+        self.manifest_changed = True
+        return result
+
     def walkzip(self, path):
         """Walks a path independent of whether it includes a zipfile or not"""
         if os.path.exists(path) and os.path.isdir(path):
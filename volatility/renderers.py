@@ -0,0 +1,284 @@
+# Volatility
+#
+# This file is part of Volatility.
+#
+# Volatility is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Volatility is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Columnar results and the renderers which write them out.
+
+A plugin which implements Command.unified_output returns a Table: a
+list of Column declarations and an iterable of rows, each row being a
+tuple with one value per column.  Every renderer compiles what it
+needs from the columns once, so that writing a row is a single pass
+over precompiled converters rather than a format specification per
+cell.
+
+The columnar format is a binary format for downstream tools:
+
+  "VOLCOL1\\n"
+  one line of JSON: {"columns": [{"name": ..., "type": ...}, ...]}
+  batches of rows, each one being:
+    <I   number of rows in the batch (0 ends the stream)
+    then every column in turn:
+      int      <q per row, INT_NULL for missing values
+      address  <Q per row, ADDRESS_NULL for missing values
+      str      <I byte length per row (STR_NULL for missing values)
+               followed by the UTF-8 encoded strings back to back
+
+read_columnar turns such a stream back into a Table.
+"""
+
+import csv
+import json
+import struct
+from json.encoder import encode_basestring_ascii
+import volatility.debug as debug
+import volatility.fmtspec as fmtspec
+import volatility.obj as obj
+
+class Address(long):
+    """Column type for addresses and other values best shown in hex"""
+
+class Column(object):
+    """Declares a column: its title, the type of its values and the
+    table_header format code used for text output"""
+
+    def __init__(self, name, type = str, format = None): #pylint: disable-msg=W0622
+        if type not in TYPE_NAMES:
+            raise TypeError("Unsupported column type {0}".format(type))
+        self.name = name
+        self.type = type
+        if format is None:
+            format = "[addrpad]" if type is Address else ""
+        self.format = format
+
+class Table(object):
+    """The columns of a result and an iterable of its rows"""
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+
+TYPE_NAMES = {int: "int", long: "int", Address: "address", str: "str"}
+TYPES = {"int": int, "address": Address, "str": str}
+
+## Memoized format codes, keyed by memory model and code
+_formats = {}
+
+def format_lookup(profile, code):
+    """Turns profile specific format codes into format specifications"""
+    code = code or ""
+    if not code.startswith('['):
+        return code
+
+    memory_model = profile.metadata.get('memory_model', '32bit')
+    key = (memory_model, code)
+    if key in _formats:
+        return _formats[key]
+
+    # Strip off the square brackets
+    name = code[1:-1].lower()
+    if name.startswith('addr'):
+        spec = fmtspec.FormatSpec("#10x")
+        if memory_model == '64bit':
+            spec.minwidth += 8
+        if 'pad' in name:
+            spec.fill = "0"
+            spec.align = spec.align if spec.align else "="
+        else:
+            # Non-padded addresses will come out as numbers,
+            # so titles should align >
+            spec.align = ">"
+        _formats[key] = spec.to_string()
+        return _formats[key]
+
+    # Something went wrong
+    debug.warning("Unknown table format specification: " + code)
+    return ""
+
+def _missing(value):
+    return value is None or isinstance(value, obj.NoneObject)
+
+def _integer(value):
+    if _missing(value):
+        return None
+    return int(value)
+
+def _text(value):
+    if _missing(value):
+        return None
+    if isinstance(value, unicode):
+        return value
+    return str(value).decode("utf-8", "replace")
+
+def _bytes(value):
+    if _missing(value):
+        return None
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    return str(value)
+
+class Renderer(object):
+    """Base class for renderers of a Table"""
+    ## Whether the output file has to be opened in binary mode
+    binary = False
+
+    def __init__(self, command):
+        self.command = command
+
+    def render(self, outfd, table):
+        """Writes out the whole table"""
+
+class TextRenderer(Renderer):
+    """Renders the table the way table_header and table_row do"""
+
+    def render(self, outfd, table):
+        command = self.command
+        command.table_header(outfd, [(c.name, c.format) for c in table.columns])
+        table_row = command.table_row
+        for row in table.rows:
+            table_row(outfd, *row)
+
+class CSVRenderer(Renderer):
+    """Renders the table as comma separated values with a title row"""
+
+    def render(self, outfd, table):
+        writer = csv.writer(outfd)
+        writer.writerow([_bytes(c.name) for c in table.columns])
+        converters = [_bytes if c.type is str else _integer for c in table.columns]
+        for row in table.rows:
+            writer.writerow(["" if v is None else v for v in
+                             [f(v) for f, v in zip(converters, row)]])
+
+def _json_integer(value):
+    if _missing(value):
+        return "null"
+    return str(int(value))
+
+def _json_text(value):
+    value = _text(value)
+    if value is None:
+        return "null"
+    return encode_basestring_ascii(value)
+
+class JSONLinesRenderer(Renderer):
+    """Renders one JSON object per row, keyed by column title"""
+
+    def render(self, outfd, table):
+        ## The keys are fixed, so each row only fills in a template
+        template = "{" + ", ".join([encode_basestring_ascii(_text(c.name)).replace("%", "%%") + ": %s"
+                                    for c in table.columns]) + "}\n"
+        converters = [_json_text if c.type is str else _json_integer for c in table.columns]
+        for row in table.rows:
+            outfd.write(template % tuple([f(v) for f, v in zip(converters, row)]))
+
+MAGIC = "VOLCOL1\n"
+INT_NULL = -(1 << 63)
+ADDRESS_NULL = (1 << 64) - 1
+STR_NULL = (1 << 32) - 1
+
+class ColumnarRenderer(Renderer):
+    """Renders the binary columnar format described above"""
+    binary = True
+    batch_size = 4096
+
+    def render(self, outfd, table):
+        columns = table.columns
+        outfd.write(MAGIC)
+        outfd.write(json.dumps({"columns": [{"name": c.name, "type": TYPE_NAMES[c.type]}
+                                            for c in columns]}) + "\n")
+        packers = [self._packer(c.type) for c in columns]
+
+        batch = []
+        for row in table.rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._write(outfd, packers, batch)
+                batch = []
+        if batch:
+            self._write(outfd, packers, batch)
+        outfd.write(struct.pack("<I", 0))
+
+    @staticmethod
+    def _packer(column_type):
+        """Returns a function packing one column of a batch"""
+        if column_type is str:
+            def pack_strings(values):
+                values = [_text(v) for v in values]
+                values = [None if v is None else v.encode("utf-8") for v in values]
+                lengths = [STR_NULL if v is None else len(v) for v in values]
+                return (struct.pack("<{0}I".format(len(lengths)), *lengths) +
+                        "".join([v for v in values if v is not None]))
+            return pack_strings
+
+        code, null = ("Q", ADDRESS_NULL) if column_type is Address else ("q", INT_NULL)
+        def pack_integers(values):
+            values = [_integer(v) for v in values]
+            values = [null if v is None else v for v in values]
+            return struct.pack("<{0}{1}".format(len(values), code), *values)
+        return pack_integers
+
+    @staticmethod
+    def _write(outfd, packers, batch):
+        outfd.write(struct.pack("<I", len(batch)))
+        for pack, values in zip(packers, zip(*batch)):
+            outfd.write(pack(values))
+
+def _read(fd, length):
+    data = fd.read(length)
+    if len(data) != length:
+        raise IOError("Truncated columnar stream")
+    return data
+
+def _columnar_rows(fd, types):
+    while True:
+        count = struct.unpack("<I", _read(fd, 4))[0]
+        if not count:
+            return
+        columns = []
+        for column_type in types:
+            if column_type is str:
+                lengths = struct.unpack("<{0}I".format(count), _read(fd, 4 * count))
+                data = _read(fd, sum([l for l in lengths if l != STR_NULL]))
+                values = []
+                pos = 0
+                for l in lengths:
+                    if l == STR_NULL:
+                        values.append(None)
+                    else:
+                        values.append(data[pos:pos + l].decode("utf-8"))
+                        pos += l
+            else:
+                code, null = ("Q", ADDRESS_NULL) if column_type is Address else ("q", INT_NULL)
+                values = struct.unpack("<{0}{1}".format(count, code), _read(fd, 8 * count))
+                values = [None if v == null else v for v in values]
+            columns.append(values)
+        for row in zip(*columns):
+            yield row
+
+def read_columnar(fd):
+    """Reads a stream written by the ColumnarRenderer back into a Table"""
+    if fd.read(len(MAGIC)) != MAGIC:
+        raise IOError("Not a columnar stream")
+    header = json.loads(fd.readline())
+    columns = [Column(c["name"], TYPES[c["type"]], "") for c in header["columns"]]
+    return Table(columns, _columnar_rows(fd, [c.type for c in columns]))
+
+RENDERERS = {
+    'text': TextRenderer,
+    'csv': CSVRenderer,
+    'jsonl': JSONLinesRenderer,
+    'columnar': ColumnarRenderer,
+    }
@@ -32,11 +32,21 @@
 @contact:      awalters@4tphi.net
 @organization: Volatility Foundation
 """
+import os
+import re
+import cPickle
+import collections
+import multiprocessing
 import volatility.debug as debug
 import volatility.registry as registry
 import volatility.addrspace as addrspace
 import volatility.constants as constants
 import volatility.conf as conf
+config = conf.ConfObject()
+
+config.add_option("PARALLEL", default = 0, type = 'int',
+                  cache_invalidator = False,
+                  help = "Number of worker processes to use when scanning")
 
 ########### Following is the new implementation of the scanning
 ########### framework. The old framework was based on PyFlag's
@@ -77,69 +87,214 @@ class BaseScanner(object):
 
         return True
 
+    def build_constraints(self):
+        """Instantiates our ScannerCheck classes from self.checks
+        against the scanner's buffer"""
+        self.constraints = []
+        check_classes = registry.get_plugin_classes(ScannerCheck)
+        for class_name, args in self.checks:
+            check = check_classes[class_name](self.buffer, **args)
+            self.constraints.append(check)
+
     overlap = 20
     def scan(self, address_space, offset = 0, maxlen = None):
+        workers = config.PARALLEL
+        if workers > 1:
+            return parallel_scan(self, address_space, offset, maxlen, workers)
+        return self.serial_scan(address_space, offset, maxlen)
+
+    def serial_scan(self, address_space, offset = 0, maxlen = None):
         self.buffer.profile = address_space.profile
-        current_offset = offset
 
         ## Build our constraints from the specified ScannerCheck
         ## classes:
-        self.constraints = []
-        for class_name, args in self.checks:
-            check = registry.get_plugin_classes(ScannerCheck)[class_name](self.buffer, **args)
-            self.constraints.append(check)
+        self.build_constraints()
+
+        for current_offset, data, _step in iter_blocks(address_space, offset, maxlen, self.overlap):
+            self.buffer.assign_buffer(data, current_offset)
 
+            for hit in self.scan_block(address_space, data, current_offset, len(data)):
+                yield hit
+
+    def scan_block(self, address_space, data, block_offset, limit):
+        """Runs our constraints over a block of data read from
+        address_space, which has already been assigned to self.buffer at
+        block_offset, and yields the offset of each hit found in the
+        first limit bytes.
+        """
         ## Which checks also have skippers?
         skippers = [ c for c in self.constraints if hasattr(c, "skip") ]
 
-        for (range_start, range_size) in sorted(address_space.get_available_addresses()):
-            # Jump to the next available point to scan from
-            # self.base_offset jumps up to be at least range_start
-            current_offset = max(range_start, current_offset)
-            range_end = range_start + range_size
-
-            # If we have a maximum length, we make sure it's less than the range_end
-            if maxlen:
-                range_end = min(range_end, offset + maxlen)
-
-            while (current_offset < range_end):
-                # We've now got range_start <= self.base_offset < range_end
-
-                # Figure out how much data to read
-                l = min(constants.SCAN_BLOCKSIZE + self.overlap, range_end - current_offset)
-
-                # Populate the buffer with data
-                # We use zread to scan what we can because there are often invalid
-                # pages in the DTB
-                data = address_space.zread(current_offset, l)
-                self.buffer.assign_buffer(data, current_offset)
-
-                ## Run checks throughout this block of data
-                i = 0
-                while i < l:
-                    if self.check_addr(i + current_offset):
-                        ## yield the offset to the start of the memory
-                        ## (after the pool tag)
-                        yield i + current_offset
-
-                    ## Where should we go next? By default we go 1 byte
-                    ## ahead, but if some of the checkers have skippers,
-                    ## we may actually go much farther. Checkers with
-                    ## skippers basically tell us that there is no way
-                    ## they can match anything before the skipped result,
-                    ## so there is no point in trying them on all the data
-                    ## in between. This optimization is useful to really
-                    ## speed things up. FIXME - currently skippers assume
-                    ## that the check must match, therefore we can skip
-                    ## the unmatchable region, but its possible that a
-                    ## scanner needs to match only some checkers.
-                    skip = 1
-                    for s in skippers:
-                        skip = max(skip, s.skip(data, i))
-
-                    i += skip
-
-                current_offset += min(constants.SCAN_BLOCKSIZE, l)
+        ## Run checks throughout this block of data
+        i = 0
+        while i < limit:
+            if self.check_addr(i + block_offset):
+                ## yield the offset to the start of the memory
+                ## (after the pool tag)
+                yield i + block_offset
+
+            ## Where should we go next? By default we go 1 byte
+            ## ahead, but if some of the checkers have skippers,
+            ## we may actually go much farther. Checkers with
+            ## skippers basically tell us that there is no way
+            ## they can match anything before the skipped result,
+            ## so there is no point in trying them on all the data
+            ## in between. This optimization is useful to really
+            ## speed things up. FIXME - currently skippers assume
+            ## that the check must match, therefore we can skip
+            ## the unmatchable region, but its possible that a
+            ## scanner needs to match only some checkers.
+            skip = 1
+            for s in skippers:
+                skip = max(skip, s.skip(data, i))
+
+            i += skip
+
+def iter_blocks(address_space, offset = 0, maxlen = None, overlap = 0):
+    """Walks the available ranges of an address space in blocks of
+    SCAN_BLOCKSIZE, yielding (block_offset, data, step) tuples.
+
+    Each block is read with an extra overlap bytes so that matches
+    straddling the block boundary can be seen, step is the number of
+    bytes the walk then advances by.
+    """
+    current_offset = offset
+
+    for (range_start, range_size) in sorted(address_space.get_available_addresses()):
+        # Jump to the next available point to scan from
+        # self.base_offset jumps up to be at least range_start
+        current_offset = max(range_start, current_offset)
+        range_end = range_start + range_size
+
+        # If we have a maximum length, we make sure it's less than the range_end
+        if maxlen:
+            range_end = min(range_end, offset + maxlen)
+
+        while (current_offset < range_end):
+            # We've now got range_start <= self.base_offset < range_end
+
+            # Figure out how much data to read
+            l = min(constants.SCAN_BLOCKSIZE + overlap, range_end - current_offset)
+            step = min(constants.SCAN_BLOCKSIZE, l)
+
+            # We use zread to scan what we can because there are often invalid
+            # pages in the DTB
+            yield current_offset, address_space.zread(current_offset, l), step
+
+            current_offset += step
+
+## State handed to the worker processes of parallel_scan. This is set
+## before the pool is created so the workers inherit it when they fork.
+_worker_scanner = None
+_worker_space = None
+
+def _init_worker(pickled_space):
+    """Reopens the address space in a newly started scan worker"""
+    global _worker_space
+    ## Each worker needs its own file handles, so the address space is
+    ## rebuilt from its pickled state rather than shared
+    _worker_space = cPickle.loads(pickled_space)
+
+def _scan_chunk(chunk):
+    """Scans [start, end) in a worker, reading up to read_end so tags
+    straddling end are seen"""
+    start, end, read_end = chunk
+    data = _worker_space.zread(start, read_end - start)
+    _worker_scanner.buffer.assign_buffer(data, start)
+    return list(_worker_scanner.scan_block(_worker_space, data, start, end - start))
+
+def _range_chunks(address_space, offset, maxlen, chunk_size):
+    """Yields (start, end, range_end) for the chunks of iter_chunks,
+    range_end being the end of the available range they are in"""
+    chunk_size = chunk_size or constants.SCAN_BLOCKSIZE
+
+    for (range_start, range_size) in sorted(address_space.get_available_addresses()):
+        start = max(range_start, offset)
+        end = range_start + range_size
+        if maxlen:
+            end = min(end, offset + maxlen)
+
+        while start < end:
+            yield start, min(start + chunk_size, end), end
+            start += chunk_size
+
+def iter_chunks(address_space, offset = 0, maxlen = None, chunk_size = None):
+    """Splits the available ranges of an address space into (start, end)
+    chunks of at most chunk_size bytes"""
+    for start, end, _range_end in _range_chunks(address_space, offset, maxlen, chunk_size):
+        yield start, end
+
+def parallel_scan(scanner, address_space, offset = 0, maxlen = None, workers = 2):
+    """Runs scanner.serial_scan over an address space in worker processes.
+
+    The address space is split into chunks which are scanned in
+    parallel, each worker reading the scanner's overlap past the end of
+    its chunk so no hits are lost on the boundaries. Hits are yielded
+    in offset order.
+
+    The available ranges are only listed once, here. The workers
+    inherit the scanner, with its constraints already built, by
+    forking and each one reads and scans just the chunks it is given.
+    On platforms without fork this falls back to a normal scan.
+    """
+    global _worker_scanner
+
+    if not hasattr(os, "fork"):
+        debug.warning("Parallel scanning is not supported on this platform")
+        for hit in scanner.serial_scan(address_space, offset, maxlen):
+            yield hit
+        return
+
+    scanner.buffer.profile = address_space.profile
+    scanner.build_constraints()
+
+    chunks = ((start, end, min(end + scanner.overlap, range_end))
+              for start, end, range_end in _range_chunks(address_space, offset, maxlen, None))
+
+    _worker_scanner = scanner
+    pool = multiprocessing.Pool(workers, _init_worker, (cPickle.dumps(address_space, 2),))
+
+    try:
+        for hits in pool.imap(_scan_chunk, chunks):
+            for hit in hits:
+                yield hit
+        pool.close()
+    finally:
+        pool.terminate()
+        _worker_scanner = None
+
+def _read_chunk(chunk):
+    """Reads [start, end) from the address space of a read worker"""
+    start, end, method = chunk
+    return start, getattr(_worker_space, method)(start, end - start)
+
+def parallel_read(address_space, chunks, method = 'zread', workers = 0):
+    """Yields (offset, data) for each (start, end) chunk of address_space.
+
+    With more than one worker the chunks are read by forked worker
+    processes, which matters for address spaces that decompress or
+    translate (hibernation, crash, vmware). Only a few chunks are in
+    flight at a time so memory stays bounded, and they are yielded in
+    order.
+    """
+    if workers <= 1 or not hasattr(os, "fork"):
+        for start, end in chunks:
+            yield start, getattr(address_space, method)(start, end - start)
+        return
+
+    pool = multiprocessing.Pool(workers, _init_worker, (cPickle.dumps(address_space, 2),))
+    try:
+        pending = collections.deque()
+        for start, end in chunks:
+            pending.append(pool.apply_async(_read_chunk, ((start, end, method),)))
+            if len(pending) > workers * 2:
+                yield pending.popleft().get()
+
+        while pending:
+            yield pending.popleft().get()
+        pool.close()
+    finally:
+        pool.terminate()
 
 class DiscontigScanner(BaseScanner):
     def scan(self, address_space, offset = 0, maxlen = None):
@@ -219,3 +374,191 @@ class PoolScanner(BaseScanner):
     def scan(self, address_space, offset = 0, maxlen = None):
         for i in BaseScanner.scan(self, address_space, offset, maxlen):
             yield self.object_offset(i, address_space)
+
+class MultiPoolScanner(BaseScanner):
+    """Runs several PoolScanners over an address space in a single pass.
+
+    Rather than walking the image once per scanner and calling
+    check_addr at every candidate offset, the pool tags of all the
+    scanners are compiled into one regular expression which is run
+    across each block. Only the offsets where a tag was found are then
+    handed to the remaining checks of the scanner(s) owning that tag.
+
+    Every scanner must have exactly one PoolTagCheck. Results are
+    yielded as (scanner, offset) tuples in offset order, where offset
+    is the value the scanner's own scan() would have produced.
+
+    The pass always runs in this process, --parallel does not apply to
+    it (the scan is already a single pass for all the scanners).
+
+        scanner = scan.MultiPoolScanner([PoolScanFile(), PoolScanDriver()])
+        for subscanner, offset in scanner.scan(address_space):
+            ...
+    """
+
+    def __init__(self, scanners, window_size = 8):
+        BaseScanner.__init__(self, window_size)
+        self.scanners = scanners
+        self.overlap = max([self.overlap] + [s.overlap for s in scanners])
+        self.tags = {}
+        self.candidates = {}
+
+    def build_constraints(self):
+        """Splits each scanner's checks into its tag and the
+        constraints which need to run against each tag hit"""
+        self.tags = {}
+        for scanner in self.scanners:
+            ## All scanners share our buffer so the checks see
+            ## the data we're currently looking at
+            scanner.buffer = self.buffer
+            scanner.build_constraints()
+
+            tags = []
+            constraints = []
+            for (class_name, _args), check in zip(scanner.checks, scanner.constraints):
+                if class_name == 'PoolTagCheck':
+                    tags.append(check.tag)
+                else:
+                    constraints.append(check)
+
+            if len(tags) != 1:
+                raise ValueError("{0} must have exactly one PoolTagCheck".format(scanner.__class__.__name__))
+
+            scanner.constraints = constraints
+            self.tags.setdefault(tags[0], []).append(scanner)
+
+        ## The pattern only reports one tag per offset, so every tag
+        ## starting with the byte at a hit is compared there. A tag
+        ## may be a prefix of another or share its offset.
+        self.candidates = {}
+        for tag in sorted(self.tags, key = len, reverse = True):
+            self.candidates.setdefault(tag[0], []).append(tag)
+
+        ## Use a lookahead so tags which overlap each other are all found
+        self.pattern = re.compile("(?=(" + "|".join([re.escape(t) for t in self.tags]) + "))")
+
+    def scan(self, address_space, offset = 0, maxlen = None):
+        self.buffer.profile = address_space.profile
+
+        self.build_constraints()
+
+        ## The overlap is only there so tags straddling the block
+        ## boundary can be matched, hits starting in it are reported
+        ## when we scan the next block
+        for current_offset, data, step in iter_blocks(address_space, offset, maxlen, self.overlap):
+            self.buffer.assign_buffer(data, current_offset)
+
+            for hit in self.scan_block(address_space, data, current_offset, step):
+                yield hit
+
+    def scan_block(self, address_space, data, block_offset, limit):
+        """Yields (scanner, offset) for every tag in the first limit
+        bytes of data which passes the owning scanner's checks"""
+        for match in self.pattern.finditer(data):
+            i = match.start()
+            if i >= limit:
+                break
+
+            found = i + block_offset
+            for tag in self.candidates[data[i]]:
+                if not data.startswith(tag, i):
+                    continue
+                for scanner in self.tags[tag]:
+                    if scanner.check_addr(found):
+                        yield scanner, scanner.object_offset(found, address_space)
+
+class ScanSession(object):
+    """Serves several scanners from a single read of an address space.
+
+    Scanners are registered before the pass starts and each gets back
+    its own iterator of results. The address space is read one block at
+    a time and every block is handed to all the registered scanners, so
+    the image is only read once regardless of how many scanners there
+    are. Blocks are read lazily as the iterators are consumed, hits
+    for the other scanners are queued until their iterator asks for
+    them.
+
+        session = scan.ScanSession(address_space)
+        procs = session.register(filescan.PoolScanProcess())
+        threads = session.register(modscan.PoolScanThreadFast())
+        for offset in procs:
+            ...
+        for offset in threads:
+            ...
+
+    The iterators yield the same offsets the scanners' scan() methods
+    would, except that hits inside the block overlap are only reported
+    once. A scanner which overrides scan() (or serial_scan()) can not
+    share the pass, as the session would skip its override, so it
+    gets the results of its own scan() instead.
+    """
+
+    ## The scan methods which do no more than the session does
+    shared_scans = (BaseScanner.scan.im_func, PoolScanner.scan.im_func,
+                    MultiPoolScanner.scan.im_func)
+
+    def __init__(self, address_space, offset = 0, maxlen = None):
+        self.address_space = address_space
+        self.offset = offset
+        self.maxlen = maxlen
+        self.scanners = []
+        self.queues = []
+        self.blocks = None
+        self.finished = False
+
+    def register(self, scanner):
+        """Adds a scanner to the session and returns an iterator of its results"""
+        if self.blocks is not None:
+            raise RuntimeError("Scanners must be registered before the scan session starts")
+
+        if (scanner.__class__.scan.im_func not in self.shared_scans or
+                scanner.__class__.serial_scan.im_func is not BaseScanner.serial_scan.im_func):
+            debug.debug("{0} overrides scan(), scanning for it separately".format(scanner.__class__.__name__))
+            return scanner.scan(self.address_space, self.offset, self.maxlen)
+
+        self.scanners.append(scanner)
+        self.queues.append(collections.deque())
+        return self._results(len(self.scanners) - 1)
+
+    def _results(self, index):
+        queue = self.queues[index]
+        while True:
+            while queue:
+                yield queue.popleft()
+            if not self._scan_next_block():
+                break
+
+        while queue:
+            yield queue.popleft()
+
+    def _start(self):
+        for scanner in self.scanners:
+            scanner.buffer.profile = self.address_space.profile
+            scanner.build_constraints()
+
+        overlap = max([s.overlap for s in self.scanners])
+        self.blocks = iter_blocks(self.address_space, self.offset, self.maxlen, overlap)
+
+    def _scan_next_block(self):
+        """Reads the next block and queues the hits of every scanner,
+        returns False once the address space is exhausted"""
+        if self.finished:
+            return False
+
+        if self.blocks is None:
+            self._start()
+
+        try:
+            current_offset, data, step = self.blocks.next()
+        except StopIteration:
+            self.finished = True
+            return False
+
+        for scanner, queue in zip(self.scanners, self.queues):
+            scanner.buffer.assign_buffer(data, current_offset)
+            for hit in scanner.scan_block(self.address_space, data, current_offset, step):
+                if isinstance(scanner, PoolScanner):
+                    hit = scanner.object_offset(hit, self.address_space)
+                queue.append(hit)
+
+        return True
@@ -0,0 +1,143 @@
+# Volatility
+#
+# This file is part of Volatility.
+#
+# Volatility is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Volatility is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Mappings for large intermediate results which spill to disk.
+
+Plugins which have to hold a lookup table over the whole image (for
+example a page to owner map) keep it in a SpillDict.  Below
+--max-memory it behaves like a dict; past it the entries move into a
+scratch sqlite database in the temporary directory and only a bounded
+write buffer stays in memory.
+"""
+
+import os
+import tempfile
+try:
+    import sqlite3
+    has_sqlite = True
+except ImportError:
+    has_sqlite = False
+import cPickle as pickle
+import volatility.conf as conf
+import volatility.debug as debug
+config = conf.ConfObject()
+
+config.add_option("MAX-MEMORY", default = 0, type = 'int',
+                  cache_invalidator = False,
+                  help = "Spill large intermediate results to disk past this many MB (0 for no limit)")
+
+_missing = object()
+
+class SpillDict(object):
+    """A dict-like mapping bounded by --max-memory
+
+    entry_size is the estimated size in bytes of one entry, which is
+    how the number of entries held in memory is bounded.  Values read
+    back from disk are copies, so callers must store a value again
+    after changing it.
+    """
+
+    def __init__(self, entry_size = 256):
+        self.entry_size = entry_size
+        ## Resolved on the first insert, after options are parsed
+        self.max_entries = None
+        self._memory = {}
+        self._db = None
+
+    def _limit(self):
+        limit = (config.MAX_MEMORY or 0) * 1024 * 1024
+        if limit and not has_sqlite:
+            debug.warning("sqlite3 is not available, ignoring --max-memory")
+            limit = 0
+        return max(limit // self.entry_size, 1) if limit else 0
+
+    def _spill(self):
+        fd, path = tempfile.mkstemp(prefix = "vol_spill_", suffix = ".db")
+        os.close(fd)
+        self._db = sqlite3.connect(path)
+        self._db.text_factory = str
+        ## This is scratch space, so durability is not needed
+        self._db.execute("PRAGMA journal_mode = OFF")
+        self._db.execute("PRAGMA synchronous = OFF")
+        self._db.execute("CREATE TABLE spill (key PRIMARY KEY, value BLOB)")
+        try:
+            ## The open connection keeps the data until we close it
+            os.unlink(path)
+            path = None
+        except OSError:
+            pass
+        self._path = path
+        debug.debug("Spilling {0} entries to disk".format(len(self._memory)))
+
+    def _flush(self):
+        self._db.executemany("INSERT OR REPLACE INTO spill VALUES (?, ?)",
+                             ((k, sqlite3.Binary(pickle.dumps(v, 2))) for k, v in self._memory.iteritems()))
+        self._db.commit()
+        self._memory.clear()
+
+    def __setitem__(self, key, value):
+        self._memory[key] = value
+        if self.max_entries is None:
+            self.max_entries = self._limit()
+        if self.max_entries and len(self._memory) > self.max_entries:
+            if self._db is None:
+                self._spill()
+            self._flush()
+
+    def get(self, key, default = None):
+        value = self._memory.get(key, _missing)
+        if value is not _missing:
+            return value
+        if self._db is not None:
+            row = self._db.execute("SELECT value FROM spill WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                return pickle.loads(str(row[0]))
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, _missing)
+        if value is _missing:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _missing) is not _missing
+
+    has_key = __contains__
+
+    def __len__(self):
+        if self._db is None:
+            return len(self._memory)
+        self._flush()
+        return self._db.execute("SELECT COUNT(*) FROM spill").fetchone()[0]
+
+    def clear(self):
+        self.close()
+        self.max_entries = None
+
+    def close(self):
+        """Drops every entry and any scratch database"""
+        self._memory.clear()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+            if self._path:
+                os.unlink(self._path)
+
+    def __del__(self):
+        self.close()
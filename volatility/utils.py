@@ -23,13 +23,57 @@ import volatility.exceptions as exceptions
 import volatility.registry as registry
 import volatility.addrspace as addrspace
 import volatility.debug as debug
+import volatility.cache as cache
 import socket
 import itertools
 
 #pylint: disable-msg=C0111
 
+## The layers of each stack resolved so far in this run, see load_as
+_stacks = {}
+
 def load_as(config, astype = 'virtual', **kwargs):
-    """Loads an address space by stacking valid ASes on top of each other (priority order first)"""
+    """Loads an address space by stacking valid ASes on top of each other (priority order first)
+
+    The layers of the stack are remembered for the rest of the run,
+    keyed on the config values they depend on, and later calls stack
+    them directly instead of voting. Every call returns new address
+    space objects, so callers may change theirs without affecting
+    anyone else (the profile is shared as always, see
+    addrspace.PROFILES). With --cache the layers are stored as well,
+    so later runs on the same image skip the voting too.
+    """
+    try:
+        key = stack_key(config, astype, kwargs)
+    except Exception, e:
+        debug.debug("Not remembering address space: {0}".format(e))
+        key = None
+
+    if key in _stacks:
+        base_as = restack(config, astype, kwargs, _stacks[key])
+        if base_as is not None:
+            return base_as
+        del _stacks[key]
+
+    base_as = None
+    if config.CACHE:
+        base_as = load_cached_stack(config, astype, kwargs)
+
+    if base_as is None:
+        base_as = vote_as(config, astype, **kwargs)
+        if config.CACHE:
+            save_cached_stack(base_as, astype, kwargs)
+
+    if key is not None:
+        try:
+            _stacks[key] = describe_stack(base_as)
+        except Exception, e:
+            debug.debug("Unable to describe address space: {0}".format(e))
+
+    return base_as
+
+def vote_as(config, astype = 'virtual', **kwargs):
+    """Stacks address spaces by trying every class in order until none of them fits"""
 
     base_as = None
     error = exceptions.AddrSpaceError()
@@ -66,6 +110,69 @@ def load_as(config, astype = 'virtual', **kwargs):
 
     return base_as
 
+def stack_key(config, astype, kwargs):
+    """Returns a key for everything which decides how load_as stacks"""
+    values = [(option, value()) for option, value in sorted(config.cache_invalidators.items())]
+    return repr((astype, sorted(kwargs.items()), config.LOCATION, values))
+
+def stack_path(astype, kwargs):
+    """Returns the cache path for a stack"""
+    return "address_spaces/stack/{0}".format(astype) + "".join(
+        ["/{0}={1}".format(k, v) for k, v in sorted(kwargs.items())])
+
+def describe_stack(space):
+    """Returns the class name and constructor args of each layer, lowest first"""
+    layers = []
+    while space:
+        args = space.__getstate__()
+        for k in ('name', 'base', 'config'):
+            args.pop(k, None)
+        layers.append((space.__class__.__name__, args))
+        space = space.base
+
+    layers.reverse()
+    return layers
+
+def load_cached_stack(config, astype, kwargs):
+    """Stacks the layers stored by an earlier run, returns None if there are none"""
+    node = cache.CACHE[stack_path(astype, kwargs)]
+    layers = node and node.get_payload()
+    if not layers:
+        return None
+
+    return restack(config, astype, kwargs, layers)
+
+def restack(config, astype, kwargs, layers):
+    """Stacks layers as returned by describe_stack, returns None if they do not fit"""
+    classes = registry.get_plugin_classes(addrspace.BaseAddressSpace)
+    base_as = None
+    try:
+        for name, args in layers:
+            args = dict(kwargs, **args)
+            ## The layers passed their checks when they were described
+            if 'dtb' in args:
+                args['skip_as_check'] = True
+            base_as = classes[name](base_as, config, astype = astype, **args)
+    except Exception, e:
+        debug.debug("Unable to restack address space: {0}".format(e))
+        return None
+
+    debug.debug("Restacked address space {0}".format(base_as))
+    return base_as
+
+def save_cached_stack(space, astype, kwargs):
+    """Stores the layers of space for later runs"""
+    try:
+        layers = describe_stack(space)
+    except Exception, e:
+        debug.debug("Unable to describe address space: {0}".format(e))
+        return
+
+    node = cache.CACHE[stack_path(astype, kwargs)]
+    if node:
+        node.set_payload(layers)
+        node.dump()
+
 def Hexdump(data, width = 16):
     """ Hexdump function shared by various plugins """
     for offset in xrange(0, len(data), width):
@@ -31,31 +31,33 @@
 
 #pylint: disable-msg=C0111
 
-from struct import unpack
-from struct import error as StructError
-
-def recombine(outbuf):
-    return "".join(outbuf[k] for k in sorted(outbuf.keys()))
+from struct import unpack_from
 
 def xpress_decode(inputBuffer):
-    outputBuffer = {}
-    outputIndex = 0
+    """Decompresses a buffer of XPRESS (LZ77 + DIRECT2) compressed data.
+
+    The output is built in a bytearray, runs of literals
+    are copied in one slice and matches are copied a whole run at a
+    time rather than byte by byte. If the input is truncated or
+    corrupt, whatever was decoded up to that point is returned.
+    """
+    outputBuffer = bytearray()
+    inputLength = len(inputBuffer)
     inputIndex = 0
+    indicator = 0
     indicatorBit = 0
     nibbleIndex = 0
 
     # we are decoding the entire input here, so I have changed
     # the check to see if we're at the end of the output buffer
     # with a check to see if we still have any input left.
-    while inputIndex < len(inputBuffer):
+    while inputIndex < inputLength:
         if (indicatorBit == 0):
             # in pseudocode this was indicatorBit = ..., but that makes no
             # sense, so I think this was intended...
-            try:
-                indicator = unpack("<L", inputBuffer[inputIndex:inputIndex + 4])[0]
-            except StructError:
-                return recombine(outputBuffer)
-
+            if inputIndex + 4 > inputLength:
+                break
+            indicator = unpack_from("<L", inputBuffer, inputIndex)[0]
             inputIndex += 4
             indicatorBit = 32
 
@@ -64,13 +66,18 @@ def xpress_decode(inputBuffer):
         # set in indicator. For example, if indicatorBit has value 4 
         # check whether the 4th bit of the value in indicator is set
         if not (indicator & (1 << indicatorBit)):
-            try:
-                outputBuffer[outputIndex] = inputBuffer[inputIndex]
-            except IndexError:
-                return recombine(outputBuffer)
-
-            inputIndex += 1
-            outputIndex += 1
+            # Gather up the whole run of literals so it can be copied
+            # in one go
+            run = 1
+            while indicatorBit and not (indicator & (1 << (indicatorBit - 1))):
+                indicatorBit -= 1
+                run += 1
+
+            literals = inputBuffer[inputIndex:inputIndex + run]
+            outputBuffer += literals
+            inputIndex += len(literals)
+            if len(literals) < run:
+                break
         else:
             # Get the length. This appears to use a scheme whereby if
             # the value at the current width is all ones, then we assume
@@ -82,58 +89,76 @@ def xpress_decode(inputBuffer):
             # Thus if a nibble byte is F2, we would first use the low part (2),
             # and then at some later point get the nibble from the high part (F).
 
-            try:
-                length = unpack("<H", inputBuffer[inputIndex:inputIndex + 2])[0]
-            except StructError:
-                return recombine(outputBuffer)
+            if inputIndex + 2 > inputLength:
+                break
+            length = unpack_from("<H", inputBuffer, inputIndex)[0]
 
             inputIndex += 2
-            offset = length / 8
-            length = length % 8
+            offset = length >> 3
+            length = length & 7
             if length == 7:
                 if nibbleIndex == 0:
+                    if inputIndex >= inputLength:
+                        break
                     nibbleIndex = inputIndex
-                    length = ord(inputBuffer[inputIndex]) % 16
+                    length = ord(inputBuffer[inputIndex]) & 15
                     inputIndex += 1
                 else:
                     # get the high nibble of the last place a nibble sized
                     # length was used thus we don't waste that extra half
                     # byte :p
-                    length = ord(inputBuffer[nibbleIndex]) / 16
+                    length = ord(inputBuffer[nibbleIndex]) >> 4
                     nibbleIndex = 0
 
                 if length == 15:
+                    if inputIndex >= inputLength:
+                        break
                     length = ord(inputBuffer[inputIndex])
                     inputIndex += 1
                     if length == 255:
-                        try:
-                            length = unpack("<H", inputBuffer[inputIndex:inputIndex + 2])[0]
-                        except StructError:
-                            return recombine(outputBuffer)
+                        if inputIndex + 2 > inputLength:
+                            break
+                        length = unpack_from("<H", inputBuffer, inputIndex)[0]
                         inputIndex = inputIndex + 2
                         length = length - (15 + 7)
                     length = length + 15
                 length = length + 7
             length = length + 3
 
-            while length != 0:
-                try:
-                    outputBuffer[outputIndex] = outputBuffer[outputIndex - offset - 1]
-                except KeyError:
-                    return recombine(outputBuffer)
-                outputIndex += 1
-                length -= 1
+            source = len(outputBuffer) - offset - 1
+            if source < 0:
+                break
+
+            distance = offset + 1
+            if length <= distance:
+                outputBuffer += outputBuffer[source:source + length]
+            else:
+                # The match overlaps the data it produces, which just
+                # repeats the last distance bytes
+                pattern = outputBuffer[source:]
+                repeats, remainder = divmod(length, distance)
+                outputBuffer += pattern * repeats + pattern[:remainder]
 
-    return recombine(outputBuffer)
+    return str(outputBuffer)
 
 try:
     import pyxpress #pylint: disable-msg=F0401
 
     xpress_decode = pyxpress.decode
+    has_pyxpress = True
 except ImportError:
-    pass
+    has_pyxpress = False
 
 if __name__ == "__main__":
     import sys
-    dec_data = xpress_decode(open(sys.argv[1]).read())
-    sys.stdout.write(dec_data)
+    if len(sys.argv) == 3 and sys.argv[1] == "--benchmark":
+        import timeit
+        data = open(sys.argv[2], "rb").read()
+        rounds = 10
+        elapsed = timeit.timeit(lambda: xpress_decode(data), number = rounds) / rounds
+        sys.stdout.write("{0}: {1} bytes in {2:.4f}s ({3:.2f} MB/s)\n".format(
+            "pyxpress" if has_pyxpress else "python", len(data), elapsed,
+            len(xpress_decode(data)) / elapsed / (1024 * 1024)))
+    else:
+        dec_data = xpress_decode(open(sys.argv[1], "rb").read())
+        sys.stdout.write(dec_data)